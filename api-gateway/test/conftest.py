@@ -1,26 +1,28 @@
 import os
-import time
-from urllib.parse import urljoin
+import secrets
+from typing import Iterator
 
 import pytest
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from e2e_support import wait_for
 
-def _is_reachable(url: str, timeout: float = 0.5) -> bool:
+# Cached readiness probe result; the gateway is only probed once per session.
+_GATEWAY_OK: bool | None = None
+
+
+def _is_reachable(sess: requests.Session, url: str, timeout: float = 0.5) -> bool:
     try:
-        r = requests.get(url, timeout=timeout)
+        r = sess.get(url, timeout=timeout)
         return r.status_code < 500
     except Exception:
         return False
 
 
-def _wait_for_reachable(url: str, total_timeout: float = 2.0, step: float = 0.25) -> bool:
-    deadline = time.time() + total_timeout
-    while time.time() < deadline:
-        if _is_reachable(url):
-            return True
-        time.sleep(step)
-    return False
+def _wait_for_reachable(sess: requests.Session, url: str, total_timeout: float = 2.0) -> bool:
+    return bool(wait_for(lambda: _is_reachable(sess, url), timeout=total_timeout))
 
 
 @pytest.fixture(scope="session")
@@ -30,24 +32,105 @@ def gateway_url() -> str:
 
 @pytest.fixture(scope="session")
 def auth_prefix(gateway_url: str) -> str:
-    return urljoin(gateway_url + "/", "api/auth")
+    return f"{gateway_url}/api/auth"
 
 
 @pytest.fixture(scope="session")
 def users_prefix(gateway_url: str) -> str:
-    return urljoin(gateway_url + "/", "api/users")
+    return f"{gateway_url}/api/users"
 
 
 @pytest.fixture(scope="session")
-def session() -> requests.Session:
+def id_suffix() -> str:
+    # One random suffix per session (per xdist worker); each test adds its own prefix.
+    return secrets.token_hex(6)
+
+
+@pytest.fixture(scope="session")
+def session() -> Iterator[requests.Session]:
     s = requests.Session()
     s.headers.update({"Content-Type": "application/json"})
-    return s
+    # Keep-alive pool shared by every test (and the threads some tests spawn).
+    # Short retries absorb connect blips and 502-504s while a service warms up;
+    # exhausted retries still hand the last response back to the assertion.
+    # Status retries are limited to idempotent methods: replaying a POST signup or
+    # PATCH the backend already applied would turn the expected result into a 400/409.
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=0,
+        backoff_factor=0.1,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "DELETE"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    yield s
+    s.close()
+
+
+@pytest.fixture(scope="session")
+def admin_token(session: requests.Session, auth_prefix: str) -> str:
+    # One admin login per session (per worker under pytest-xdist).
+    r = session.post(
+        f"{auth_prefix}/login/start",
+        json={"email": "admin@example.com", "password": "admin"},
+        timeout=2.0,
+    )
+    if r.status_code != 200:
+        pytest.skip("Admin login not available")
+    data = r.json()
+    if "access_token" not in data:
+        pytest.skip("2FA required for admin account")
+    return data["access_token"]
+
+
+@pytest.fixture(scope="session")
+def admin_headers(admin_token: str) -> dict:
+    return {"Authorization": f"Bearer {admin_token}"}
+
+
+@pytest.fixture(scope="session")
+def role_test_users(session: requests.Session, auth_prefix: str, users_prefix: str, admin_headers: dict, id_suffix: str):
+    # Two users provisioned once per session; signup (bcrypt) is the expensive part.
+    password = "Pass1234AA"
+    users = []
+    for i in (1, 2):
+        email = f"resident{i}-{id_suffix}@example.com"
+        r = session.post(
+            f"{auth_prefix}/signup",
+            json={
+                "user_name": f"resident{i}_{id_suffix}",
+                "email": email,
+                "password": password,
+                "first_name": "Test",
+                "last_name": "User",
+            },
+            timeout=2.0,
+        )
+        if r.status_code == 201:
+            user_id = r.json()["id"]
+        elif r.status_code in (409, 400):
+            # Already exists; fetch by email using admin.
+            rr = session.get(users_prefix, params={"email": email}, headers=admin_headers, timeout=2.0)
+            rr.raise_for_status()
+            user_id = rr.json()["id"]
+        else:
+            r.raise_for_status()
+            pytest.fail(f"Unexpected signup status {r.status_code}: {r.text}")
+        users.append((user_id, email, password))
+    return users
 
 
 @pytest.fixture(scope="session", autouse=True)
-def require_gateway(gateway_url: str):
+def require_gateway(gateway_url: str, session: requests.Session):
     # Skip the whole suite if the gateway isn't running.
     # This makes these tests safe for CI/unit runs.
-    if not _wait_for_reachable(gateway_url):
+    # Probing through the shared session also warms its keep-alive connection.
+    global _GATEWAY_OK
+    if _GATEWAY_OK is None:
+        _GATEWAY_OK = _wait_for_reachable(session, gateway_url)
+    if not _GATEWAY_OK:
         pytest.skip(f"API gateway not reachable at {gateway_url}")
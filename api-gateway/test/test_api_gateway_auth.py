@@ -1,5 +1,3 @@
-import uuid
-
 import pytest
 
 
@@ -26,20 +24,20 @@ def _require_non_2fa_tokens(resp):
     raise AssertionError(f"Unexpected login response: {data}")
 
 
-def test_signup_weak_password_returns_400(session, auth_prefix):
-    email = f"weak-{uuid.uuid4().hex[:8]}@example.com"
+def test_signup_weak_password_returns_400(session, auth_prefix, id_suffix):
+    email = f"weak-{id_suffix}@example.com"
     r = session.post(
         f"{auth_prefix}/signup",
-        json=_signup_payload(email=email, username=f"weak_{uuid.uuid4().hex[:8]}", password="password456"),
+        json=_signup_payload(email=email, username=f"weak_{id_suffix}", password="password456"),
         timeout=2.0,
     )
     assert r.status_code == 400, r.text
 
 
-def test_login_refresh_logout_flow(session, auth_prefix, users_prefix):
+def test_login_refresh_logout_flow(session, auth_prefix, users_prefix, id_suffix):
     # NOTE: this is an integration test that assumes the stack is up.
     # It is non-interactive and skips any flows that require email verification or 2FA.
-    suffix = uuid.uuid4().hex[:8]
+    suffix = id_suffix
     email = f"testuser-{suffix}@example.com"
     password = "Pass1234AA"
     username = f"testuser_{suffix}"
@@ -62,11 +60,14 @@ def test_login_refresh_logout_flow(session, auth_prefix, users_prefix):
     assert refresh_token
 
     headers = {"Authorization": f"Bearer {access_token}"}
+    me_url = f"{auth_prefix}/me"
+    refresh_url = f"{auth_prefix}/refresh"
 
-    r = session.get(f"{auth_prefix}/me", headers=headers, timeout=2.0)
-    assert r.status_code == 200, r.text
+    me = session.get(me_url, headers=headers, timeout=2.0)
+    assert me.status_code == 200, me.text
+    user_id = me.json().get("id")
 
-    r = session.post(f"{auth_prefix}/refresh", json={"refresh_token": refresh_token}, timeout=2.0)
+    r = session.post(refresh_url, json={"refresh_token": refresh_token}, timeout=2.0)
     assert r.status_code == 200, r.text
     new_tokens = r.json()
     assert new_tokens.get("access_token")
@@ -76,18 +77,14 @@ def test_login_refresh_logout_flow(session, auth_prefix, users_prefix):
     r = session.post(f"{auth_prefix}/logout", json={"refresh_token": refresh_token}, headers=headers, timeout=2.0)
     assert r.status_code == 200, r.text
 
-    r = session.post(f"{auth_prefix}/refresh", json={"refresh_token": refresh_token}, timeout=2.0)
+    r = session.post(refresh_url, json={"refresh_token": refresh_token}, timeout=2.0)
     assert r.status_code == 401, r.text
 
     # /me with invalid token should 401
-    r = session.get(f"{auth_prefix}/me", headers={"Authorization": "Bearer invalidtoken"}, timeout=2.0)
+    r = session.get(me_url, headers={"Authorization": "Bearer invalidtoken"}, timeout=2.0)
     assert r.status_code == 401, r.text
 
     # Lockout is admin-only; should be 403 when called as non-admin.
-    me = session.get(f"{auth_prefix}/me", headers=headers, timeout=2.0)
-    if me.status_code != 200:
-        pytest.skip("Unable to read /me; skipping lockout assertion")
-    user_id = me.json().get("id")
     if not user_id:
         pytest.skip("No user id in /me response")
     r = session.post(f"{users_prefix}/{user_id}/lockout", json={"lock": True}, headers=headers, timeout=2.0)
@@ -1,39 +1,32 @@
-import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
-import requests
-
-def _redact_headers(headers: dict):
-    if not headers:
-        return headers
-    redacted = {}
-    for k, v in headers.items():
-        if k.lower() == "authorization":
-            redacted[k] = "<redacted>"
-        else:
-            redacted[k] = v
-    return redacted
-
-def http(method, url, *, headers=None, json=None, params=None):
-    print(f"\n==> {method} {url}")
-    if params:
-        print("Params:", params)
-    if headers:
-        print("Headers:", _redact_headers(headers))
-    if json is not None:
-        print("JSON:", json)
-    resp = requests.request(method, url, headers=headers, json=json, params=params)
-    print(f"<== {resp.status_code} {resp.reason}")
-    ct = resp.headers.get("Content-Type", "")
-    body = resp.text
-    if len(body) > 800:
-        print("Body (truncated):", body[:800] + "...")
-    else:
-        print("Body:", body)
+
+log = logging.getLogger(__name__)
+
+class _RedactedHeaders:
+    # Redaction only runs when a DEBUG record is actually formatted.
+    __slots__ = ("headers",)
+
+    def __init__(self, headers):
+        self.headers = headers
+
+    def __repr__(self):
+        return repr({k: "<redacted>" if k.lower() == "authorization" else v for k, v in self.headers.items()})
+
+def http(session, method, url, *, headers=None, json=None, params=None):
+    debug = log.isEnabledFor(logging.DEBUG)
+    if debug:
+        log.debug("==> %s %s params=%s headers=%r json=%s", method, url, params, _RedactedHeaders(headers or {}), json)
+    resp = session.request(method, url, headers=headers, json=json, params=params, timeout=2.0)
+    if debug:
+        body = resp.text
+        log.debug("<== %s %s body=%.800s%s", resp.status_code, resp.reason, body, "..." if len(body) > 800 else "")
     return resp
 
-def login(auth_prefix, email, password):
-    r = http("POST", f"{auth_prefix}/login/start", json={"email": email, "password": password})
+def login(session, auth_prefix, email, password):
+    r = http(session, "POST", f"{auth_prefix}/login/start", json={"email": email, "password": password})
     if r.status_code != 200:
         pytest.skip("Admin login not available")
     data = r.json()
@@ -44,64 +37,46 @@ def login(auth_prefix, email, password):
     raise RuntimeError("Unexpected login response")
 
 
-def signup_user(auth_prefix, users_prefix, email, username, password):
-    r = http(
-        "POST",
-        f"{auth_prefix}/signup",
-        json={
-            "user_name": username,
-            "email": email,
-            "password": password,
-            "first_name": "Test",
-            "last_name": "User",
-        },
-    )
-    if r.status_code == 201:
-        return r.json()["id"]
-    if r.status_code in (409, 400):
-        # Fetch by email using admin.
-        admin_token = login(auth_prefix, "admin@example.com", "admin")
-        rr = http(
-            "GET",
-            f"{users_prefix}",
-            params={"email": email},
-            headers={"Authorization": f"Bearer {admin_token}"},
+def run_pair(pool, first, second):
+    # Independent calls share the session's connection pool, so they can overlap;
+    # the test waits for max(latency) instead of the sum.
+    f1 = pool.submit(first)
+    f2 = pool.submit(second)
+    return f1.result(), f2.result()
+
+def test_role_flow(session, auth_prefix, users_prefix, admin_headers, role_test_users):
+    (u1_id, u1_email, password), (u2_id, _, _) = role_test_users
+    u1_url = f"{users_prefix}/{u1_id}"
+    u2_url = f"{users_prefix}/{u2_id}"
+
+    # Shared by both pairs and shut down when the test finishes.
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="role-pair") as pool:
+        log.info("Assign resident to %s and admin to %s as admin", u1_id, u2_id)
+        r1, r2 = run_pair(
+            pool,
+            lambda: http(session, "PATCH", u1_url, json={"role": "resident"}, headers=admin_headers),
+            lambda: http(session, "PATCH", u2_url, json={"role": "admin"}, headers=admin_headers),
+        )
+        assert r1.status_code == 200, r1.text
+        assert r2.status_code == 200, r2.text
+
+        res1_token = login(session, auth_prefix, u1_email, password)
+        res1_headers = {"Authorization": f"Bearer {res1_token}"}
+
+        log.info("Resident tries to set %s to resident", u2_id)
+        r = http(session, "PATCH", u2_url, json={"role": "resident"}, headers=res1_headers)
+        assert r.status_code in (200, 403), r.text
+
+        log.info("Resident tries to set %s to admin (should be 403)", u1_id)
+        r = http(session, "PATCH", u1_url, json={"role": "admin"}, headers=res1_headers)
+        assert r.status_code == 403, r.text
+
+        log.info("Admin resets %s and %s to user", u1_id, u2_id)
+        r1, r2 = run_pair(
+            pool,
+            lambda: http(session, "PATCH", u1_url, json={"role": "user"}, headers=admin_headers),
+            lambda: http(session, "PATCH", u2_url, json={"role": "user"}, headers=admin_headers),
         )
-        rr.raise_for_status()
-        return rr.json()["id"]
-    r.raise_for_status()
-
-def test_role_flow(auth_prefix, users_prefix):
-    admin_token = login(auth_prefix, "admin@example.com", "admin")
-    admin_headers = {"Authorization": f"Bearer {admin_token}"}
-
-    suffix = uuid.uuid4().hex[:6]
-    password = "Pass1234AA"
-    u1_id = signup_user(auth_prefix, users_prefix, f"resident1-{suffix}@example.com", f"resident1_{suffix}", password)
-    u2_id = signup_user(auth_prefix, users_prefix, f"resident2-{suffix}@example.com", f"resident2_{suffix}", password)
-
-    print(f"Assign resident to {u1_id} as admin")
-    r = http("PATCH", f"{users_prefix}/{u1_id}", json={"role": "resident"}, headers=admin_headers)
-    assert r.status_code == 200, r.text
-    print(f"Assign admin to {u2_id} as admin")
-    r = http("PATCH", f"{users_prefix}/{u2_id}", json={"role": "admin"}, headers=admin_headers)
-    assert r.status_code == 200, r.text
-
-    res1_token = login(auth_prefix, f"resident1-{suffix}@example.com", password)
-    res1_headers = {"Authorization": f"Bearer {res1_token}"}
-
-    print(f"Resident tries to set {u2_id} to resident")
-    r = http("PATCH", f"{users_prefix}/{u2_id}", json={"role": "resident"}, headers=res1_headers)
-    assert r.status_code in (200, 403), r.text
-
-    print(f"Resident tries to set {u1_id} to admin (should be 403)")
-    r = http("PATCH", f"{users_prefix}/{u1_id}", json={"role": "admin"}, headers=res1_headers)
-    assert r.status_code == 403, r.text
-
-    print(f"Admin resets {u1_id} to user")
-    r = http("PATCH", f"{users_prefix}/{u1_id}", json={"role": "user"}, headers=admin_headers)
-    assert r.status_code == 200, r.text
-    print(f"Admin resets {u2_id} to user")
-    r = http("PATCH", f"{users_prefix}/{u2_id}", json={"role": "user"}, headers=admin_headers)
-    assert r.status_code == 200, r.text
+        assert r1.status_code == 200, r1.text
+        assert r2.status_code == 200, r2.text
 
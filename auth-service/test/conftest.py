@@ -1,25 +1,40 @@
 import os
-import time
+import secrets
+from typing import Iterator
 
 import pytest
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from e2e_support import get_last_email_code, wait_for
 
-def _is_reachable(url: str, timeout: float = 0.5) -> bool:
+# Cached readiness probe result; auth-service is only probed once per session.
+_AUTH_SERVICE_OK: bool | None = None
+
+
+def _is_reachable(sess: requests.Session, url: str, timeout: float = 0.5) -> bool:
     try:
-        r = requests.get(url, timeout=timeout)
+        r = sess.get(url, timeout=timeout)
         return r.status_code < 500
     except Exception:
         return False
 
 
-def _wait_for_reachable(url: str, total_timeout: float = 2.0, step: float = 0.25) -> bool:
-    deadline = time.time() + total_timeout
-    while time.time() < deadline:
-        if _is_reachable(url):
-            return True
-        time.sleep(step)
-    return False
+def _wait_for_reachable(sess: requests.Session, url: str, total_timeout: float = 2.0) -> bool:
+    return bool(wait_for(lambda: _is_reachable(sess, url), timeout=total_timeout))
+
+
+@pytest.fixture(scope="session")
+def email_code():
+    # Returns a callable that waits for the code auth-service logged for user_id.
+    def _get(user_id: str, kind: str) -> str:
+        code = wait_for(lambda: get_last_email_code(user_id, kind))
+        if not code:
+            pytest.skip(f"No {kind} code found in auth-service logs")
+        return code
+
+    return _get
 
 
 @pytest.fixture(scope="session")
@@ -29,14 +44,42 @@ def auth_service_url() -> str:
 
 
 @pytest.fixture(scope="session")
-def session() -> requests.Session:
+def id_suffix() -> str:
+    # One random suffix per session (per xdist worker); each test adds its own prefix.
+    return secrets.token_hex(6)
+
+
+@pytest.fixture(scope="session")
+def session() -> Iterator[requests.Session]:
     s = requests.Session()
     s.headers.update({"Content-Type": "application/json"})
-    return s
+    # Keep-alive pool shared by every test (and the threads some tests spawn).
+    # Short retries absorb connect blips and 502-504s while a service warms up;
+    # exhausted retries still hand the last response back to the assertion.
+    # Status retries are limited to idempotent methods: replaying a POST signup or
+    # PATCH the backend already applied would turn the expected result into a 400/409.
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=0,
+        backoff_factor=0.1,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "DELETE"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    yield s
+    s.close()
 
 
 @pytest.fixture(scope="session", autouse=True)
-def require_auth_service(auth_service_url: str):
+def require_auth_service(auth_service_url: str, session: requests.Session):
     # Skip the whole suite if auth-service isn't running.
-    if not _wait_for_reachable(auth_service_url):
+    # Probing through the shared session also warms its keep-alive connection.
+    global _AUTH_SERVICE_OK
+    if _AUTH_SERVICE_OK is None:
+        _AUTH_SERVICE_OK = _wait_for_reachable(session, auth_service_url)
+    if not _AUTH_SERVICE_OK:
         pytest.skip(f"Auth service not reachable at {auth_service_url}")
@@ -1,5 +1,3 @@
-import uuid
-
 import pytest
 
 
@@ -22,18 +20,41 @@ def _require_non_2fa_tokens(resp):
     raise AssertionError(f"Unexpected login response: {data}")
 
 
-def test_signup_weak_password_returns_400(session, auth_service_url):
-    email = f"weak-{uuid.uuid4().hex[:8]}@example.com"
+def test_signup_weak_password_returns_400(session, auth_service_url, id_suffix):
+    email = f"weak-{id_suffix}@example.com"
     r = session.post(
         f"{auth_service_url}/signup",
-        json=_signup_payload(email=email, username=f"weak_{uuid.uuid4().hex[:8]}", password="password456"),
+        json=_signup_payload(email=email, username=f"weak_{id_suffix}", password="password456"),
         timeout=2.0,
     )
     assert r.status_code == 400, r.text
 
 
-def test_login_refresh_logout_flow(session, auth_service_url):
-    suffix = uuid.uuid4().hex[:8]
+def test_signup_duplicate_email_is_rejected(session, auth_service_url, id_suffix):
+    suffix = id_suffix
+    email = f"dup-{suffix}@example.com"
+    r = session.post(f"{auth_service_url}/signup", json=_signup_payload(email, f"dup_{suffix}", "Pass1234AA"), timeout=2.0)
+    if r.status_code != 201:
+        pytest.skip(f"Signup unavailable ({r.status_code}); skipping duplicate check")
+
+    # auth-service maps the user-service 409 to a 400 "user already exists".
+    r = session.post(f"{auth_service_url}/signup", json=_signup_payload(email, f"dup2_{suffix}", "Pass1234AA"), timeout=2.0)
+    assert r.status_code in (400, 409), r.text
+
+
+def test_login_wrong_password_returns_401(session, auth_service_url, id_suffix):
+    suffix = id_suffix
+    email = f"wrongpw-{suffix}@example.com"
+    r = session.post(f"{auth_service_url}/signup", json=_signup_payload(email, f"wrongpw_{suffix}", "Pass1234AA"), timeout=2.0)
+    if r.status_code != 201:
+        pytest.skip(f"Signup unavailable ({r.status_code}); skipping wrong password check")
+
+    r = session.post(f"{auth_service_url}/login/start", json={"email": email, "password": "Wrong1234AA"}, timeout=2.0)
+    assert r.status_code == 401, r.text
+
+
+def test_login_refresh_logout_flow(session, auth_service_url, id_suffix):
+    suffix = id_suffix
     email = f"testuser-{suffix}@example.com"
     password = "Pass1234AA"
     username = f"testuser_{suffix}"
@@ -55,11 +76,13 @@ def test_login_refresh_logout_flow(session, auth_service_url):
     assert refresh_token
 
     headers = {"Authorization": f"Bearer {access_token}"}
+    me_url = f"{auth_service_url}/me"
+    refresh_url = f"{auth_service_url}/refresh"
 
-    r = session.get(f"{auth_service_url}/me", headers=headers, timeout=2.0)
+    r = session.get(me_url, headers=headers, timeout=2.0)
     assert r.status_code == 200, r.text
 
-    r = session.post(f"{auth_service_url}/refresh", json={"refresh_token": refresh_token}, timeout=2.0)
+    r = session.post(refresh_url, json={"refresh_token": refresh_token}, timeout=2.0)
     assert r.status_code == 200, r.text
     new_tokens = r.json()
     assert new_tokens.get("access_token")
@@ -68,8 +91,28 @@ def test_login_refresh_logout_flow(session, auth_service_url):
     r = session.post(f"{auth_service_url}/logout", json={"refresh_token": refresh_token}, headers=headers, timeout=2.0)
     assert r.status_code == 200, r.text
 
-    r = session.post(f"{auth_service_url}/refresh", json={"refresh_token": refresh_token}, timeout=2.0)
+    r = session.post(refresh_url, json={"refresh_token": refresh_token}, timeout=2.0)
     assert r.status_code == 401, r.text
 
-    r = session.get(f"{auth_service_url}/me", headers={"Authorization": "Bearer invalidtoken"}, timeout=2.0)
+    r = session.get(me_url, headers={"Authorization": "Bearer invalidtoken"}, timeout=2.0)
     assert r.status_code == 401, r.text
+
+
+def test_email_verification_flow(session, auth_service_url, email_code, id_suffix):
+    suffix = id_suffix
+    email = f"verify-{suffix}@example.com"
+    r = session.post(
+        f"{auth_service_url}/signup",
+        json=_signup_payload(email, f"verify_{suffix}", "Pass1234AA"),
+        timeout=2.0,
+    )
+    if r.status_code != 201:
+        pytest.skip(f"Signup unavailable ({r.status_code}); skipping email verification")
+    user_id = r.json()["id"]
+
+    r = session.post(f"{auth_service_url}/email/verify/request", json={"user_id": user_id}, timeout=2.0)
+    assert r.status_code == 200, r.text
+
+    code = email_code(user_id, "email_verify")
+    r = session.post(f"{auth_service_url}/email/verify/confirm", json={"user_id": user_id, "code": code}, timeout=2.0)
+    assert r.status_code == 200, r.text
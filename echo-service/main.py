@@ -4,76 +4,121 @@ Simple WebSocket Echo Service for testing JWT authentication
 """
 import asyncio
 import websockets
-import json
+import uvloop
+import orjson
 import logging
+import os
+import queue
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
-logging.basicConfig(level=logging.INFO)
+# Records are handed to a listener thread so stderr writes never block the event loop.
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = QueueListener(_log_queue, _log_stream)
+logging.basicConfig(
+    level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+    handlers=[QueueHandler(_log_queue)],
+)
 logger = logging.getLogger(__name__)
 
+
+def _json(value):
+    """Encode a value with orjson; frames stay text so browser clients can parse them"""
+    return orjson.dumps(value).decode("utf-8")
+
+
+# Pre-rendered frames; only the JSON-encoded fields are substituted.
+_WELCOME_TEMPLATE = (
+    '{"type":"welcome","message":"WebSocket Echo Service - JWT Auth Test",'
+    '"timestamp":%s,"path":%s}'
+)
+_ECHO_TEMPLATE = '{"type":"echo","original":%s,"timestamp":%s,"client_ip":%s}'
+_ERROR_TEMPLATE = '{"type":"error","error":%s,"timestamp":%s}'
+
+# JSON-encoded wall-clock timestamp, refreshed once per second by _tick_clock().
+_NOW_JSON = _json(datetime.now().isoformat(timespec="seconds"))
+
+
+async def _tick_clock():
+    """Refresh the cached timestamp so handlers never format datetimes themselves"""
+    global _NOW_JSON
+    while True:
+        _NOW_JSON = _json(datetime.now().isoformat(timespec="seconds"))
+        await asyncio.sleep(1.0)
+
+
 async def echo_handler(websocket, path):
     """Handle WebSocket connections and echo back messages"""
     client_ip = websocket.remote_address[0]
-    logger.info(f"New WebSocket connection from {client_ip} on path {path}")
+    client_ip_json = _json(client_ip)
+    logger.info("New WebSocket connection from %s on path %s", client_ip, path)
     
     try:
         # Send welcome message
-        welcome_msg = {
-            "type": "welcome",
-            "message": "WebSocket Echo Service - JWT Auth Test",
-            "timestamp": datetime.now().isoformat(),
-            "path": path
-        }
-        await websocket.send(json.dumps(welcome_msg))
+        welcome_msg = _WELCOME_TEMPLATE % (_NOW_JSON, _json(path))
+        await websocket.send(welcome_msg)
         
         # Echo loop
         async for message in websocket:
             try:
-                logger.info(f"Received from {client_ip}: {message}")
-                
-                # Try to parse as JSON, otherwise treat as plain text
-                try:
-                    data = json.loads(message)
-                    response = {
-                        "type": "echo",
-                        "original": data,
-                        "timestamp": datetime.now().isoformat(),
-                        "client_ip": client_ip
-                    }
-                except json.JSONDecodeError:
-                    response = {
-                        "type": "echo",
-                        "original": message,
-                        "timestamp": datetime.now().isoformat(),
-                        "client_ip": client_ip
-                    }
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received from %s: %s", client_ip, message)
                 
-                await websocket.send(json.dumps(response))
+                if isinstance(message, bytes):
+                    message = message.decode("utf-8")
+
+                # Valid JSON objects/arrays are spliced back verbatim instead of being
+                # re-serialized; anything else is echoed as a string.
+                original = _json(message)
+                stripped = message.lstrip()
+                if stripped and stripped[0] in "{[":
+                    try:
+                        orjson.loads(message)
+                    except orjson.JSONDecodeError:
+                        pass
+                    else:
+                        original = message
+                response = _ECHO_TEMPLATE % (original, _NOW_JSON, client_ip_json)
+
+                await websocket.send(response)
                 
             except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                error_response = {
-                    "type": "error",
-                    "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                }
-                await websocket.send(json.dumps(error_response))
+                logger.error("Error processing message: %s", e)
+                error_response = _ERROR_TEMPLATE % (_json(str(e)), _NOW_JSON)
+                await websocket.send(error_response)
                 
     except websockets.exceptions.ConnectionClosed:
-        logger.info(f"Connection closed for {client_ip}")
+        logger.info("Connection closed for %s", client_ip)
     except Exception as e:
-        logger.error(f"Error in echo_handler: {e}")
+        logger.error("Error in echo_handler: %s", e)
 
 async def main():
     """Start the WebSocket server"""
     host = "0.0.0.0"
     port = 9000
     
-    logger.info(f"Starting WebSocket Echo Service on {host}:{port}")
+    logger.info("Starting WebSocket Echo Service on %s:%s", host, port)
+    clock = asyncio.create_task(_tick_clock())  # keep a reference so the task isn't collected
     
-    async with websockets.serve(echo_handler, host, port):
+    # permessage-deflate only burns CPU on echo traffic, so it is disabled.
+    async with websockets.serve(
+        echo_handler,
+        host,
+        port,
+        compression=None,
+        max_size=2**20,
+        ping_interval=20,
+        ping_timeout=20,
+    ):
         logger.info("WebSocket Echo Service is running...")
         await asyncio.Future()  # Run forever
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    uvloop.install()
+    _log_listener.start()
+    try:
+        asyncio.run(main())
+    finally:
+        _log_listener.stop()
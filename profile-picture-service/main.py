@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 from typing import Any
 
-from fastapi import FastAPI, File, Form, HTTPException, Response, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
+from PIL import features as pil_features
 
 from config import ConfigurationError, Settings, load_settings
 from service import ALLOWED_UPLOAD_TYPES, ProfilePictureService
@@ -12,9 +15,37 @@ from storage import ObjectNotFoundError, S3Storage
 
 logger = logging.getLogger(__name__)
 
+# Allowance for the multipart envelope (boundaries, part headers, form fields) on top
+# of the file itself when judging a request by its Content-Length.
+UPLOAD_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+async def _read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    # The Content-Length middleware rejects most oversized requests before the body is
+    # parsed; check the parsed part's size too so it is not read into memory.
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail="file too large")
+    content = await file.read()
+    if len(content) > max_bytes:
+        raise HTTPException(status_code=413, detail="file too large")
+    return content
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header (list, W/ tags or *) against etag."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
 
 def _build_app() -> FastAPI:
     settings = load_settings()
+    if not pil_features.check_feature("libjpeg_turbo"):
+        logger.warning("Pillow is not linked against libjpeg-turbo; JPEG upload decoding will be slow")
     storage = S3Storage(settings)
     service = ProfilePictureService(settings, storage)
 
@@ -22,6 +53,16 @@ def _build_app() -> FastAPI:
     app.state.settings = settings
     app.state.profile_picture_service = service
 
+    @app.middleware("http")
+    async def reject_oversized_uploads(request: Request, call_next):
+        # Form parsing spools the whole body before the handler runs, so an honest but
+        # oversized Content-Length is refused here without reading it.
+        if request.method == "POST" and request.url.path == "/upload":
+            content_length = request.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > settings.max_upload_bytes + UPLOAD_MULTIPART_OVERHEAD_BYTES:
+                return JSONResponse(status_code=413, content={"detail": "file too large"})
+        return await call_next(request)
+
     @app.get("/")
     async def root() -> dict[str, Any]:
         return {
@@ -33,7 +74,7 @@ def _build_app() -> FastAPI:
     @app.post("/generate/{user_id}")
     async def generate_avatar(user_id: str, size: int = 256) -> dict[str, Any]:
         try:
-            result = service.generate_avatar(user_id, size)
+            result = await run_in_threadpool(service.generate_avatar, user_id, size)
         except Exception as exc:  # noqa: BLE001
             logger.exception("avatar generation failed", extra={"user_id": user_id})
             raise HTTPException(status_code=500, detail=f"Avatar generation failed: {exc}") from exc
@@ -50,9 +91,9 @@ def _build_app() -> FastAPI:
         content_type = (file.content_type or "").lower()
         if content_type and content_type not in ALLOWED_UPLOAD_TYPES:
             raise HTTPException(status_code=400, detail=f"File must be an image (got content_type={file.content_type})")
-        content = await file.read()
+        content = await _read_upload(file, settings.max_upload_bytes)
         try:
-            result = service.upload_profile_picture(user_id, content)
+            result = await run_in_threadpool(service.upload_profile_picture, user_id, content)
         except ValueError as exc:
             raise HTTPException(status_code=400, detail=str(exc)) from exc
         except Exception as exc:  # noqa: BLE001
@@ -75,7 +116,9 @@ def _build_app() -> FastAPI:
             raise HTTPException(status_code=400, detail="user_id and filename are required")
         if content_type and content_type not in ALLOWED_UPLOAD_TYPES:
             raise HTTPException(status_code=400, detail="unsupported content type")
-        prepared = service.prepare_upload(user_id, filename, content_type or "application/octet-stream")
+        prepared = await run_in_threadpool(
+            service.prepare_upload, user_id, filename, content_type or "application/octet-stream"
+        )
         return {
             "success": True,
             "object_key": prepared.object_key,
@@ -92,7 +135,7 @@ def _build_app() -> FastAPI:
         if not user_id or not object_key:
             raise HTTPException(status_code=400, detail="user_id and object_key are required")
         try:
-            result = service.complete_upload(user_id, object_key)
+            result = await run_in_threadpool(service.complete_upload, user_id, object_key)
         except ObjectNotFoundError as exc:
             raise HTTPException(status_code=404, detail="uploaded object not found") from exc
         except ValueError as exc:
@@ -108,18 +151,23 @@ def _build_app() -> FastAPI:
         }
 
     @app.get("/profile-pictures/users/{user_id}")
-    async def get_avatar(user_id: str) -> Response:
+    async def get_avatar(user_id: str, request: Request) -> Response:
         try:
-            content = service.get_avatar(user_id)
-            content_type = service.get_avatar_content_type(user_id)
+            avatar = await run_in_threadpool(service.get_avatar, user_id)
         except ObjectNotFoundError as exc:
             raise HTTPException(status_code=404, detail="avatar not found") from exc
-        return Response(content=content, media_type=content_type, headers={"Cache-Control": "no-cache, no-store, must-revalidate"})
+        # Avatars can be replaced at any time, so clients must revalidate; the content
+        # ETag lets them do that without downloading an unchanged image again.
+        etag = f'"{hashlib.blake2b(avatar.content, digest_size=16).hexdigest()}"'
+        headers = {"Cache-Control": "no-cache", "ETag": etag}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=avatar.content, media_type=avatar.content_type, headers=headers)
 
     @app.get("/profile-pictures/users/{user_id}/access-url")
     async def get_avatar_access_url(user_id: str) -> dict[str, Any]:
         try:
-            url = service.get_access_url(user_id)
+            url = await run_in_threadpool(service.get_access_url, user_id)
         except ObjectNotFoundError as exc:
             raise HTTPException(status_code=404, detail="avatar not found") from exc
         return {"success": True, "url": url, "expires_in": settings.presign_expiry_seconds}
@@ -1,22 +1,27 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
 import hashlib
-import random
 import uuid
 from urllib.parse import quote
 
-from PIL import Image, ImageDraw
+import numpy as np
+from PIL import Image
 
 from config import Settings
-from storage import ObjectNotFoundError, PreparedUpload, StorageBackend
+from storage import ObjectNotFoundError, PreparedUpload, StorageBackend, StoredObject
 
 
 ALLOWED_UPLOAD_TYPES = {"image/jpeg", "image/png", "image/jpg", "image/gif", "image/webp"}
 MAX_AVATAR_SIZE = 512
 DEFAULT_AVATAR_SIZE = 256
+# zlib levels for PNG output: generated avatars are flat color runs that compress
+# well at level 1; uploaded photos get a little more effort to keep objects small.
+GENERATED_PNG_COMPRESS_LEVEL = 1
+UPLOAD_PNG_COMPRESS_LEVEL = 3
 
 
 @dataclass(frozen=True)
@@ -36,7 +41,7 @@ class ProfilePictureService:
         normalized_size = max(64, min(size, MAX_AVATAR_SIZE))
         random_part = uuid.uuid4().hex
         avatar = _generate_pixel_avatar(f"{user_id}_{random_part}", normalized_size)
-        return self._store_image(user_id, avatar)
+        return self._store_image(user_id, avatar, GENERATED_PNG_COMPRESS_LEVEL)
 
     def prepare_upload(self, user_id: str, filename: str, content_type: str) -> PreparedUpload:
         effective_content_type = (content_type or "application/octet-stream").strip().lower()
@@ -46,19 +51,16 @@ class ProfilePictureService:
     def complete_upload(self, user_id: str, object_key: str) -> AvatarResult:
         stored = self.storage.read_bytes(object_key)
         image = _decode_and_normalize_upload(stored.content, self.settings.max_upload_bytes)
-        result = self._store_image(user_id, image)
+        result = self._store_image(user_id, image, UPLOAD_PNG_COMPRESS_LEVEL)
         self.storage.delete(object_key)
         return result
 
     def upload_profile_picture(self, user_id: str, content: bytes) -> AvatarResult:
         image = _decode_and_normalize_upload(content, self.settings.max_upload_bytes)
-        return self._store_image(user_id, image)
+        return self._store_image(user_id, image, UPLOAD_PNG_COMPRESS_LEVEL)
 
-    def get_avatar(self, user_id: str) -> bytes:
-        return self.storage.read_bytes(self._avatar_key(user_id)).content
-
-    def get_avatar_content_type(self, user_id: str) -> str:
-        return self.storage.read_bytes(self._avatar_key(user_id)).content_type
+    def get_avatar(self, user_id: str) -> StoredObject:
+        return self.storage.read_bytes(self._avatar_key(user_id))
 
     def get_access_url(self, user_id: str) -> str:
         key = self._avatar_key(user_id)
@@ -66,13 +68,14 @@ class ProfilePictureService:
             raise ObjectNotFoundError(key)
         return self.storage.create_access_url(key, self.settings.presign_expiry_seconds)
 
-    def _store_image(self, user_id: str, image: Image.Image) -> AvatarResult:
-        avatar_bytes = _render_avatar_png(image)
+    def _store_image(self, user_id: str, image: Image.Image, compress_level: int) -> AvatarResult:
+        avatar_bytes = _render_avatar_png(image, compress_level)
         key = self._avatar_key(user_id)
         self.storage.put_bytes(key, avatar_bytes, "image/png")
         version = uuid.uuid4().hex[:12]
         public_url = self._public_url(user_id, version)
-        access_url = self.get_access_url(user_id)
+        # The object was just written, so skip the HEAD round trip get_access_url() does.
+        access_url = self.storage.create_access_url(key, self.settings.presign_expiry_seconds)
         return AvatarResult(asset_key=key, public_url=public_url, access_url=access_url, version=version)
 
     def _avatar_key(self, user_id: str) -> str:
@@ -91,53 +94,75 @@ class ProfilePictureService:
 
 
 def _generate_pixel_avatar(seed: str, size: int = DEFAULT_AVATAR_SIZE) -> Image.Image:
-    random.seed(hashlib.md5(seed.encode("utf-8")).hexdigest())
-    img = Image.new("RGB", (size, size), (240, 240, 240))
-    draw = ImageDraw.Draw(img)
+    rng = np.random.default_rng(int.from_bytes(hashlib.blake2b(seed.encode("utf-8"), digest_size=8).digest(), "little"))
     grid_size = 8
     pixel_size = size // grid_size
-    primary_color = (random.randint(50, 200), random.randint(50, 200), random.randint(50, 200))
-    secondary_color = (
-        min(255, primary_color[0] + 50),
-        min(255, primary_color[1] + 50),
-        min(255, primary_color[2] + 50),
-    )
-    for y in range(grid_size):
-        for x in range(grid_size // 2):
-            if random.random() > 0.5:
-                color = primary_color if random.random() > 0.3 else secondary_color
-                left_x = x * pixel_size
-                left_y = y * pixel_size
-                draw.rectangle([left_x, left_y, left_x + pixel_size, left_y + pixel_size], fill=color)
-                right_x = (grid_size - 1 - x) * pixel_size
-                draw.rectangle([right_x, left_y, right_x + pixel_size, left_y + pixel_size], fill=color)
-    return img
+    primary_color = tuple(int(channel) for channel in rng.integers(50, 201, size=3))
+    secondary_color = tuple(min(255, channel + 50) for channel in primary_color)
+    # Palette index per cell: 0 background, 1 primary, 2 secondary. Only the left half
+    # is drawn from the RNG; the right half mirrors it.
+    filled = rng.random((grid_size, grid_size // 2)) > 0.5
+    primary = rng.random((grid_size, grid_size // 2)) > 0.3
+    half = np.where(filled, np.where(primary, 1, 2), 0).astype(np.uint8)
+    cells = np.concatenate([half, half[:, ::-1]], axis=1)
+    palette = np.array([(240, 240, 240), primary_color, secondary_color], dtype=np.uint8)
+    # Build the 8x8 grid as an image and let Pillow's nearest-neighbour resize expand it;
+    # an integer scale factor reproduces the cell blocks exactly.
+    grid = Image.frombuffer("RGB", (grid_size, grid_size), palette[cells].tobytes(), "raw", "RGB", 0, 1)
+    span = grid_size * pixel_size
+    avatar = grid.resize((span, span), Image.Resampling.NEAREST)
+    if span == size:
+        return avatar
+    canvas = Image.new("RGB", (size, size), (240, 240, 240))
+    canvas.paste(avatar, (0, 0))
+    return canvas
 
 
 def _decode_and_normalize_upload(content: bytes, max_upload_bytes: int) -> Image.Image:
     if len(content) > max_upload_bytes:
         raise ValueError("file too large")
+    # Decode once: load() surfaces corrupt or truncated data just like verify() did,
+    # without parsing the upload a second time.
     try:
         image = Image.open(BytesIO(content))
-        image.verify()
-        image = Image.open(BytesIO(content))
+        # JPEG only: let libjpeg decode with a scaled IDCT straight to <= 2x the target,
+        # so the resample below starts from a small source. No-op for other formats.
+        image.draft("RGB", (DEFAULT_AVATAR_SIZE * 2, DEFAULT_AVATAR_SIZE * 2))
+        image.load()
     except Exception as exc:  # noqa: BLE001
         raise ValueError("file is not a valid image") from exc
-    if image.mode != "RGB":
+    # Transparent uploads stay RGBA through the resize and are composited onto the white
+    # square in the final paste; RGB and L need no conversion at all.
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+    elif image.mode not in ("RGB", "L"):
         image = image.convert("RGB")
-    image.thumbnail((DEFAULT_AVATAR_SIZE, DEFAULT_AVATAR_SIZE), Image.Resampling.LANCZOS)
-    square = Image.new("RGB", (DEFAULT_AVATAR_SIZE, DEFAULT_AVATAR_SIZE), (255, 255, 255))
+    scale = DEFAULT_AVATAR_SIZE / max(image.width, image.height)
+    if scale < 1:
+        # reducing_gap box-reduces by an integer factor first, so LANCZOS only has to
+        # convolve over a source close to the target size.
+        target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    square = _blank_canvas(DEFAULT_AVATAR_SIZE).copy()
     offset = ((DEFAULT_AVATAR_SIZE - image.width) // 2, (DEFAULT_AVATAR_SIZE - image.height) // 2)
-    square.paste(image, offset)
+    square.paste(image, offset, image if image.mode == "RGBA" else None)
     return square
 
 
-def _render_avatar_png(image: Image.Image) -> bytes:
+@lru_cache(maxsize=None)
+def _blank_canvas(size: int) -> Image.Image:
+    # Shared template; callers must copy() before drawing on it.
+    return Image.new("RGB", (size, size), (255, 255, 255))
+
+
+def _render_avatar_png(image: Image.Image, compress_level: int) -> bytes:
     output = BytesIO()
-    image.save(output, format="PNG")
+    image.save(output, format="PNG", compress_level=compress_level, optimize=False)
     return output.getvalue()
 
 
+@lru_cache(maxsize=4096)
 def _safe_key_component(value: str) -> str:
     safe = []
     for char in value.strip():
@@ -84,6 +84,15 @@ def test_generate_avatar_returns_public_url_and_serves_image(monkeypatch, tmp_pa
     assert avatar_response.headers["content-type"].startswith("image/png")
     assert avatar_response.content
 
+    etag = avatar_response.headers["etag"]
+    revalidated = client.get("/profile-pictures/users/user-1", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert not revalidated.content
+
+    for header in (f'"stale", W/{etag}', "*"):
+        assert client.get("/profile-pictures/users/user-1", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/profile-pictures/users/user-1", headers={"If-None-Match": '"stale"'}).status_code == 200
+
 
 def test_presigned_upload_flow(monkeypatch, tmp_path):
     client = _load_test_client(monkeypatch, tmp_path)
@@ -112,3 +121,85 @@ def test_presigned_upload_flow(monkeypatch, tmp_path):
     avatar_response = client.get("/profile-pictures/users/user-2")
     assert avatar_response.status_code == 200
     assert avatar_response.headers["content-type"].startswith("image/png")
+
+
+def test_pixel_avatar_is_deterministic_and_mirrored():
+    from service import _generate_pixel_avatar
+
+    first = _generate_pixel_avatar("user-3_seed", 256)
+    second = _generate_pixel_avatar("user-3_seed", 256)
+    assert first.size == (256, 256)
+    assert first.tobytes() == second.tobytes()
+    assert first.transpose(Image.Transpose.FLIP_LEFT_RIGHT).tobytes() == first.tobytes()
+
+
+def test_upload_rejects_invalid_image(monkeypatch, tmp_path):
+    client = _load_test_client(monkeypatch, tmp_path)
+
+    response = client.post(
+        "/upload",
+        data={"user_id": "user-4"},
+        files={"file": ("avatar.png", _png_bytes()[:40], "image/png")},
+    )
+    assert response.status_code == 400
+
+
+def test_upload_large_jpeg_is_normalized_to_avatar_size(monkeypatch, tmp_path):
+    client = _load_test_client(monkeypatch, tmp_path)
+    source = BytesIO()
+    Image.new("RGB", (2000, 1000), (200, 10, 10)).save(source, format="JPEG")
+
+    response = client.post(
+        "/upload",
+        data={"user_id": "user-5"},
+        files={"file": ("avatar.jpg", source.getvalue(), "image/jpeg")},
+    )
+    assert response.status_code == 200
+
+    avatar = Image.open(BytesIO(client.get("/profile-pictures/users/user-5").content))
+    assert avatar.size == (256, 256)
+    assert avatar.getpixel((128, 128))[0] > 150
+    assert avatar.getpixel((128, 0)) == (255, 255, 255)
+
+
+def test_upload_rejects_oversized_file(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_PICTURE_MAX_UPLOAD_BYTES", "2048")
+    client = _load_test_client(monkeypatch, tmp_path)
+
+    response = client.post(
+        "/upload",
+        data={"user_id": "user-6"},
+        files={"file": ("avatar.png", b"\0" * 4096, "image/png")},
+    )
+    assert response.status_code == 413
+
+
+def test_upload_rejects_oversized_content_length(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_PICTURE_MAX_UPLOAD_BYTES", "2048")
+    client = _load_test_client(monkeypatch, tmp_path)
+
+    response = client.post(
+        "/upload",
+        data={"user_id": "user-7"},
+        files={"file": ("avatar.png", b"\0" * (256 * 1024), "image/png")},
+    )
+    assert response.status_code == 413
+    assert response.json() == {"detail": "file too large"}
+
+
+def test_upload_composites_transparency_onto_white(monkeypatch, tmp_path):
+    client = _load_test_client(monkeypatch, tmp_path)
+    image = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
+    output = BytesIO()
+    image.save(output, format="PNG")
+
+    response = client.post(
+        "/upload",
+        data={"user_id": "user-8"},
+        files={"file": ("avatar.png", output.getvalue(), "image/png")},
+    )
+    assert response.status_code == 200
+
+    avatar = Image.open(BytesIO(client.get("/profile-pictures/users/user-8").content))
+    assert avatar.mode == "RGB"
+    assert avatar.getpixel((128, 128)) == (255, 255, 255)
@@ -85,7 +85,7 @@ class WebSocketTester:
                 extra_headers=extra_headers,
                 ping_interval=None,  # Disable ping for testing
                 close_timeout=5,
-                open_timeout=10
+                open_timeout=5
             ) as websocket:
                 print_success("WebSocket connection established!")
                 
@@ -152,10 +152,8 @@ class WebSocketTester:
             print_info(f"Sending: {test_message}")
             await websocket.send(test_message)
             
-            response = await asyncio.wait_for(websocket.recv(), timeout=5)
-            print_success(f"Echo response: {response}")
-            
-            # Test 2: Send JSON
+            # Test 2: Send JSON right behind it; the echo service answers frames in
+            # order, so both replies are read after a single round trip.
             test_json = {
                 "type": "test",
                 "message": "Hello JSON!",
@@ -165,6 +163,9 @@ class WebSocketTester:
             print_info(f"Sending JSON: {json_message}")
             await websocket.send(json_message)
             
+            response = await asyncio.wait_for(websocket.recv(), timeout=5)
+            print_success(f"Echo response: {response}")
+            
             json_response = await asyncio.wait_for(websocket.recv(), timeout=5)
             print_success(f"JSON echo response: {json_response}")
             
@@ -0,0 +1,85 @@
+"""Helpers shared by the e2e scripts and the pytest suites.
+
+- poll_backoff / wait_for: monotonic exponential-backoff polling.
+- get_last_email_code: read one-time codes (email verification, password reset,
+  email 2FA) from the auth-service logs. auth-service logs every code it emits
+  (slog text or JSON handler), e.g.
+    msg="email verification code sent" code=123456 user_id=<uuid>
+
+The e2e scripts import this module as a sibling; the pytest suites get it on
+sys.path through the root pytest.ini (pythonpath).
+
+Environment:
+  HOMENAVI_AUTH_SERVICE_CONTAINER  read `docker logs <container>` instead of
+                                   `docker compose logs auth-service`
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import time
+from typing import Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def poll_backoff(timeout: float, initial: float = 0.05, cap: float = 0.5) -> Iterator[None]:
+    """Yield once per poll attempt, backing off exponentially until the monotonic deadline."""
+    deadline = time.monotonic() + timeout
+    delay = initial
+    while True:
+        yield
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 1.5, cap)
+
+
+def wait_for(fn: Callable[[], T], timeout: float = 3.0, step: float = 0.05, max_step: float = 0.5) -> Optional[T]:
+    """Poll fn until it returns a truthy value; None once the timeout expires."""
+    for _ in poll_backoff(timeout, step, max_step):
+        value = fn()
+        if value:
+            return value
+    return None
+
+CODE_MESSAGES = {
+    "email_verify": "email verification code sent",
+    "password_reset": "password reset code sent",
+    "2fa_email": "2fa email code sent",
+}
+_CODE_RE = re.compile(r'"?code"?[=:]"?(\d{6})"?')
+_USER_ID_RE = re.compile(r'"?user_id"?[=:]"?([0-9a-fA-F-]{36})"?')
+
+
+def auth_service_logs(tail: int = 200) -> str:
+    container = os.getenv("HOMENAVI_AUTH_SERVICE_CONTAINER")
+    if container:
+        cmd = ["docker", "logs", "--tail", str(tail), container]
+    else:
+        cmd = ["docker", "compose", "logs", "--no-log-prefix", "--tail", str(tail), "auth-service"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=5.0, check=False)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return out.stdout + out.stderr
+
+
+def get_last_email_code(user_id: Optional[str], kind: str) -> Optional[str]:
+    """Most recent code of this kind logged for user_id (any user when user_id is None)."""
+    message = CODE_MESSAGES[kind]
+    for line in reversed(auth_service_logs().splitlines()):
+        if message not in line:
+            continue
+        code = _CODE_RE.search(line)
+        if not code:
+            continue
+        if user_id is not None:
+            uid = _USER_ID_RE.search(line)
+            if not uid or uid.group(1) != user_id:
+                continue
+        return code.group(1)
+    return None
@@ -17,15 +17,24 @@ Environment:
 
 from __future__ import annotations
 
+import functools
 import json
 import os
+import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, Dict, Iterable, List, Tuple
 from urllib.parse import urlparse
 
 import paho.mqtt.client as mqtt
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib codec is used when absent
+    orjson = None
 
 GATEWAY_ORIGIN = os.getenv("GATEWAY_ORIGIN", "http://localhost:8080")
 DEFAULT_WS_URL = os.getenv("WS_URL", "ws://localhost:8080/ws/hdp")
@@ -38,10 +47,33 @@ REQUIRE_DEVICES = os.getenv("REQUIRE_DEVICES", "0").lower() in ("1", "true", "ye
 SNAPSHOT_PATH = os.getenv("DEVICES_SNAPSHOT_PATH", "devices_snapshot.json")
 HDP_PREFIX = "homenavi/hdp/"
 STATE_PREFIX = f"{HDP_PREFIX}device/state/"
+_WS_RE = re.compile(r"\s+")
 
 CollectHandler = Callable[[str, bytes], None]
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _write_snapshot(path: str, records: List[Dict[str, Any]]) -> None:
+    """Write records as a JSON array, one record at a time to keep peak memory flat."""
+    if orjson is None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(records, fh, indent=2, default=str)
+        return
+    with open(path, "wb") as fh:
+        fh.write(b"[")
+        for index, record in enumerate(records):
+            fh.write(b"\n" if index == 0 else b",\n")
+            fh.write(orjson.dumps(record, option=orjson.OPT_INDENT_2, default=str))
+        fh.write(b"\n]\n" if records else b"]\n")
+
+# Login and metadata share one keep-alive connection to the gateway.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_maxsize=8))
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=8))
+
 def login() -> str:
-    response = requests.post(
+    response = SESSION.post(
         f"{GATEWAY_ORIGIN}/api/auth/login/start",
         json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
         timeout=5,
@@ -51,6 +83,7 @@ def login() -> str:
     token = data.get("access_token")
     if not token:
         raise RuntimeError("missing access_token in login response")
+    SESSION.headers["Authorization"] = f"Bearer {token}"
     return token
 
 def mqtt_collect(
@@ -110,25 +143,33 @@ def mqtt_collect(
     if rc != 0:
         raise RuntimeError(f"{label} connect failed rc={rc}")
 
-    client.loop_start()
-    start = time.time()
+    # Drive the network loop on this thread: loop() blocks in select() until traffic
+    # arrives or the timeout expires, and callbacks run inline, so no background
+    # thread or polling is needed.
+    deadline = time.time() + max_wait
     try:
         while True:
-            now = time.time()
             if connect_rc["value"] not in (None, 0):
                 raise RuntimeError(f"{label} connect rc={connect_rc['value']}")
-            if now - start >= max_wait:
-                break
-            if message_count > 0 and last_msg_at > 0 and (now - last_msg_at) >= idle_timeout:
+            now = time.time()
+            remaining = deadline - now
+            if remaining <= 0:
                 break
-            time.sleep(0.05)
+            if message_count > 0:
+                idle_left = last_msg_at + idle_timeout - now
+                if idle_left <= 0:
+                    break
+                remaining = min(remaining, idle_left)
+            loop_rc = client.loop(timeout=remaining)
+            if loop_rc != mqtt.MQTT_ERR_SUCCESS:
+                raise RuntimeError(f"{label} loop rc={loop_rc}")
     finally:
         try:
             client.disconnect()
-            time.sleep(0.1)
+            # Flush the DISCONNECT packet now that no background loop is running.
+            client.loop(timeout=0.1)
         except Exception:
             pass
-        client.loop_stop()
 
     return message_count
 
@@ -140,7 +181,7 @@ def safe_json(payload: bytes) -> Any:
     if not text:
         return None
     try:
-        return json.loads(text)
+        return _loads(text)
     except Exception:
         return text
 
@@ -159,7 +200,7 @@ def _ensure_json(obj: Dict[str, Any], key: str) -> None:
             obj[key] = [] if key in ("capabilities", "inputs") else None
             return
         try:
-            obj[key] = json.loads(txt)
+            obj[key] = _loads(txt)
         except Exception:
             # Leave original value if JSON parsing fails.
             return
@@ -176,7 +217,7 @@ def normalize_device_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
         entry["description"] = desc.decode("utf-8", errors="ignore")
     return entry
 
-def _format_unit(value: Any) -> str:
+def _format_unit_uncached(value: Any) -> str:
     if value is None:
         return ""
     try:
@@ -185,74 +226,75 @@ def _format_unit(value: Any) -> str:
         return ""
     return text
 
+_format_unit_cached = functools.lru_cache(maxsize=256)(_format_unit_uncached)
 
-def summarize_capabilities(caps: Any, limit: int = 4) -> str:
-    if isinstance(caps, (bytes, bytearray)):
+def _format_unit(value: Any) -> str:
+    # Unit strings repeat heavily across devices; unhashable values skip the cache.
+    try:
+        return _format_unit_cached(value)
+    except TypeError:
+        return _format_unit_uncached(value)
+
+
+def _first_truthy(get: Callable[[str], Any], keys: Tuple[str, ...]) -> Any:
+    value = None
+    for key in keys:
+        value = get(key)
+        if value:
+            break
+    return value
+
+
+def _summarize(items: Any, limit: int, prefix: str, id_keys: Tuple[str, ...], type_keys: Tuple[str, ...]) -> str:
+    if isinstance(items, (bytes, bytearray)):
         try:
-            caps = caps.decode("utf-8")
+            items = items.decode("utf-8")
         except Exception:
-            caps = None
-    if isinstance(caps, str):
+            items = None
+    if isinstance(items, str):
         try:
-            caps = json.loads(caps)
+            items = _loads(items)
         except Exception:
-            return "caps=?"
-    if isinstance(caps, dict):
-        caps = [caps]
-    if not isinstance(caps, list) or len(caps) == 0:
-        return "caps=0"
+            return f"{prefix}=?"
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list) or len(items) == 0:
+        return f"{prefix}=0"
+    fmt_unit = _format_unit
     labels: List[str] = []
-    for cap in caps[:limit]:
-        if isinstance(cap, dict):
-            ident = cap.get("id") or cap.get("property") or cap.get("name")
-            kind = cap.get("kind") or cap.get("type")
-            unit = _format_unit(cap.get("unit") or cap.get("units"))
-            unit_suffix = f"({unit})" if unit else ""
-            if ident and kind:
-                labels.append(f"{ident}:{kind}{unit_suffix}")
-            elif ident:
-                labels.append(f"{ident}{unit_suffix}")
-            elif kind:
-                labels.append(f"{kind}{unit_suffix}")
-    extra = f" (+{len(caps) - limit})" if len(caps) > limit else ""
-    return f"caps={len(caps)}[{', '.join(labels)}{extra}]"
+    append = labels.append
+    for item in items[:limit]:
+        if not isinstance(item, dict):
+            continue
+        get = item.get
+        ident = _first_truthy(get, id_keys)
+        kind = _first_truthy(get, type_keys)
+        label = f"{ident}:{kind}" if ident and kind else (ident or kind)
+        if not label:
+            continue
+        unit = fmt_unit(get("unit") or get("units"))
+        append(f"{label}({unit})" if unit else str(label))
+    extra = f" (+{len(items) - limit})" if len(items) > limit else ""
+    return "{}={}[{}{}]".format(prefix, len(items), ", ".join(labels), extra)
+
+
+def summarize_capabilities(caps: Any, limit: int = 4) -> str:
+    return _summarize(caps, limit, "caps", ("id", "property", "name"), ("kind", "type"))
 
 def summarize_inputs(inputs: Any, limit: int = 3) -> str:
-    if isinstance(inputs, (bytes, bytearray)):
-        try:
-            inputs = inputs.decode("utf-8")
-        except Exception:
-            inputs = None
-    if isinstance(inputs, str):
-        try:
-            inputs = json.loads(inputs)
-        except Exception:
-            return "inputs=?"
-    if isinstance(inputs, dict):
-        inputs = [inputs]
-    if not isinstance(inputs, list) or len(inputs) == 0:
-        return "inputs=0"
-    labels: List[str] = []
-    for inp in inputs[:limit]:
-        if isinstance(inp, dict):
-            ident = inp.get("id")
-            typ = inp.get("type")
-            unit = _format_unit(inp.get("unit") or inp.get("units"))
-            unit_suffix = f"({unit})" if unit else ""
-            if ident and typ:
-                labels.append(f"{ident}:{typ}{unit_suffix}")
-            elif typ:
-                labels.append(f"{typ}{unit_suffix}")
-            elif ident:
-                labels.append(f"{ident}{unit_suffix}")
-    extra = f" (+{len(inputs) - limit})" if len(inputs) > limit else ""
-    return f"inputs={len(inputs)}[{', '.join(labels)}{extra}]"
+    return _summarize(inputs, limit, "inputs", ("id",), ("type",))
+
+def _set_external(id_to_external: Dict[str, str], dev_id: str, entry: Dict[str, Any]) -> None:
+    """Map dev_id to its external_id, falling back to the id itself, if not mapped yet."""
+    if dev_id in id_to_external:
+        return
+    external = entry.get("external_id")
+    id_to_external[dev_id] = external if isinstance(external, str) and external else dev_id
 
 def fetch_device_metadata(token: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
     url = f"{GATEWAY_ORIGIN}/api/hdp/devices"
-    headers = {"Authorization": f"Bearer {token}"}
     cookies = {"auth_token": token}
-    response = requests.get(url, headers=headers, cookies=cookies, timeout=10)
+    response = SESSION.get(url, cookies=cookies, timeout=10)
     response.raise_for_status()
     payload = response.json()
     if not isinstance(payload, list):
@@ -268,34 +310,16 @@ def fetch_device_metadata(token: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[s
         if not isinstance(dev_id, str) or not dev_id:
             continue
         devices[dev_id] = entry
-        external = entry.get("external_id")
-        if isinstance(external, str) and external:
-            id_to_external[dev_id] = external
-        else:
-            id_to_external[dev_id] = dev_id
+        _set_external(id_to_external, dev_id, entry)
     return devices, id_to_external
 
-def fetch_device_states(
-    token: str,
-    devices: Dict[str, Dict[str, Any]],
-    id_to_external: Dict[str, str],
-) -> Dict[str, Any]:
+def fetch_device_states(token: str) -> Dict[str, Any]:
     states: Dict[str, Any] = {}
 
+    # Keep the per-message work minimal; run() merges states into devices afterwards.
     def handler(topic: str, payload: bytes) -> None:
         if topic.startswith(STATE_PREFIX):
-            dev_id = topic[len(STATE_PREFIX) :]
-            data = safe_json(payload)
-            states[dev_id] = data
-            entry = devices.setdefault(dev_id, {"id": dev_id})
-            normalize_device_entry(entry)
-            entry["_last_state"] = data
-            if dev_id not in id_to_external:
-                ext = entry.get("external_id")
-                if isinstance(ext, str) and ext:
-                    id_to_external[dev_id] = ext
-                else:
-                    id_to_external[dev_id] = dev_id
+            states[topic[len(STATE_PREFIX) :]] = safe_json(payload)
 
     mqtt_collect(
         WS_STATE_URL,
@@ -308,21 +332,23 @@ def fetch_device_states(
 
 def run() -> None:
     token = login()
-    devices, id_to_external = fetch_device_metadata(token)
+    # The metadata GET and the MQTT state collection are independent once we have a
+    # token, so overlap the HTTP round trip with the broker connect/subscribe.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        metadata_future = pool.submit(fetch_device_metadata, token)
+        states = fetch_device_states(token)
+        devices, id_to_external = metadata_future.result()
     metadata_keys = set(devices.keys())
-    states = fetch_device_states(token, devices, id_to_external)
 
-    # Merge state payloads for any devices not seen via metadata.
+    # Merge state payloads for any devices not seen via metadata. Entries are
+    # normalized once, when they are created here or in fetch_device_metadata.
     for dev_id, state in states.items():
-        entry = devices.setdefault(dev_id, {"id": dev_id})
-        normalize_device_entry(entry)
+        entry = devices.get(dev_id)
+        if entry is None:
+            entry = devices[dev_id] = normalize_device_entry({"id": dev_id})
         entry["_last_state"] = state
-        if dev_id not in id_to_external:
-            external = entry.get("external_id")
-            if isinstance(external, str) and external:
-                id_to_external[dev_id] = external
-            else:
-                id_to_external[dev_id] = dev_id
+    for dev_id, entry in devices.items():
+        _set_external(id_to_external, dev_id, entry)
 
     logical: Dict[str, Dict[str, Any]] = {}
     ignored = 0
@@ -341,7 +367,7 @@ def run() -> None:
                     include = True
                     break
         if include:
-            logical[dev_id] = normalize_device_entry(data)
+            logical[dev_id] = data
         else:
             ignored += 1
 
@@ -359,11 +385,13 @@ def run() -> None:
     print(f"DEVICES_COUNT {count}")
     sorted_keys = sorted(logical.keys())
     records: List[Dict[str, Any]] = []
+    # Per-device output is buffered and written in one go after the loop.
+    lines: List[str] = []
+    emit = lines.append
     for dev_id in sorted_keys:
         entry = logical[dev_id]
         display_key = id_to_external.get(dev_id, entry.get("external_id") or dev_id)
-        record = dict(entry)
-        state_obj = record.pop("_last_state", None)
+        state_obj = entry.get("_last_state")
         caps_summary = summarize_capabilities(entry.get("capabilities"))
         inputs_summary = summarize_inputs(entry.get("inputs"))
         manufacturer = entry.get("manufacturer") or "-"
@@ -371,7 +399,7 @@ def run() -> None:
         firmware = entry.get("firmware") or entry.get("software_build_id") or "-"
         description_val = entry.get("description")
         if isinstance(description_val, str):
-            normalized_desc = " ".join(description_val.split())
+            normalized_desc = _WS_RE.sub(" ", description_val).strip()
         else:
             normalized_desc = ""
         if normalized_desc:
@@ -400,23 +428,29 @@ def run() -> None:
                     state_keys.append(f"{label}({unit})")
                 else:
                     state_keys.append(label)
-        print(
+        emit(
             f"- {display_key} id={dev_id_label} type={dev_type} manufacturer={manufacturer} "
             f"model={model} description={short_desc} firmware={firmware} {caps_summary} {inputs_summary} state_keys={state_keys}"
         )
         if SHOW_METADATA:
-            print(json.dumps(entry, indent=2)[:2000])
+            emit(json.dumps(entry, indent=2)[:2000])
             if isinstance(state_obj, dict):
-                print("STATE_SAMPLE " + json.dumps({k: state_obj[k] for k in state_keys}, indent=2))
+                emit("STATE_SAMPLE " + json.dumps({k: state_obj[k] for k in state_keys}, indent=2))
+        # Entries are not revisited after this loop, so once the metadata dump has been
+        # emitted, swap _last_state for state and reuse the entry as the snapshot record.
+        record = entry
+        record.pop("_last_state", None)
         if state_obj is not None:
             record["state"] = state_obj
         records.append(record)
+    if lines:
+        sys.stdout.write("\n".join(lines))
+        sys.stdout.write("\n")
 
     print(f"ALL_DEVICE_STATES_ATTACHED {1 if states_attached else 0}")
 
     try:
-        with open(SNAPSHOT_PATH, "w", encoding="utf-8") as fh:
-            json.dump(records, fh, indent=2, default=str)
+        _write_snapshot(SNAPSHOT_PATH, records)
         print(f"DEVICE_DATA_SNAPSHOT {SNAPSHOT_PATH} records={len(records)}")
     except Exception as exc:
         print(f"DEVICE_DATA_SNAPSHOT_FAILED {exc}")
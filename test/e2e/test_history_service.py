@@ -15,16 +15,32 @@ Environment:
   HISTORY_LIMIT     (default 5)
   HISTORY_ORDER     (default desc)
   HISTORY_MAX_DEVICES (default 20)
+  E2E_LOG           (default INFO; DEBUG also prints every response body)
 """
 
 from __future__ import annotations
 
 import json
+import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from typing import Any, Dict, List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib codec is used when absent
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional; without it the device list is parsed in one go
+    ijson = None
 
 
 GATEWAY_ORIGIN = os.getenv("GATEWAY_ORIGIN", "http://localhost:8080").rstrip("/")
@@ -34,31 +50,50 @@ HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT", "5"))
 HISTORY_ORDER = os.getenv("HISTORY_ORDER", "desc")
 HISTORY_MAX_DEVICES = int(os.getenv("HISTORY_MAX_DEVICES", "20"))
 
+_loads = orjson.loads if orjson is not None else json.loads
+
+logger = logging.getLogger("e2e.history")
+
+def parse_body(r: requests.Response) -> Any:
+    """Decode the JSON body; None when it is not valid JSON."""
+    try:
+        return _loads(r.content)
+    except ValueError:
+        return None
+
 
-def _print_json(label: str, obj: Any) -> None:
-    print(f"\n== {label} ==")
-    print(json.dumps(obj, indent=2, sort_keys=True, default=str))
+def _format_body(r: requests.Response, obj: Any) -> str:
+    if "application/json" not in r.headers.get("content-type", ""):
+        return r.text
+    if obj is None:
+        return r.text
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS, default=str).decode("utf-8")
+    return json.dumps(obj, indent=2, sort_keys=True, default=str)
 
 
-def _print_response(label: str, r: requests.Response) -> None:
-    print(f"\n== {label} ==")
-    print(f"{r.request.method} {r.request.url}")
-    print(f"Status: {r.status_code}")
-    ct = r.headers.get("content-type", "")
-    if "application/json" in ct:
-        try:
-            _print_json("body", r.json())
-        except Exception:
-            print(r.text)
-    else:
-        print(r.text)
+def _log_response(label: str, r: requests.Response, body: Any) -> None:
+    """Log one summary line per response; bodies are only rendered for DEBUG runs or failures."""
+    failed = r.status_code >= 400
+    level = logging.WARNING if failed else logging.INFO
+    logger.log(level, "%s: %s %s -> %d", label, r.request.method, r.request.url, r.status_code)
+    if failed or logger.isEnabledFor(logging.DEBUG):
+        logger.log(level if failed else logging.DEBUG, "%s body:\n%s", label, _format_body(r, body))
+
+
+def warm_connection(session: requests.Session) -> None:
+    """Open the pooled gateway connection ahead of login via the unauthenticated /health."""
+    try:
+        session.get(f"{GATEWAY_ORIGIN}/health", timeout=3, allow_redirects=False).close()
+    except requests.RequestException:
+        pass  # best effort; login opens the connection itself
 
 
 def login_start(session: requests.Session) -> str:
     url = f"{GATEWAY_ORIGIN}/api/auth/login/start"
     r = session.post(url, json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}, timeout=10)
     r.raise_for_status()
-    data: Dict[str, Any] = r.json()
+    data: Dict[str, Any] = _loads(r.content)
 
     token = data.get("access_token")
     if not token:
@@ -77,6 +112,7 @@ def get_json(
     *,
     token: Optional[str] = None,
     params: Optional[dict] = None,
+    stream: bool = False,
 ) -> requests.Response:
     url = f"{GATEWAY_ORIGIN}{path}"
     headers: Dict[str, str] = {}
@@ -85,66 +121,81 @@ def get_json(
         headers["Authorization"] = f"Bearer {token}"
         # Some gateway middleware paths also accept the token in the cookie.
         cookies["auth_token"] = token
-    return session.get(url, headers=headers, cookies=cookies, params=params, timeout=15)
-
-
-def fetch_device_ids(session: requests.Session, token: str) -> List[str]:
-    r = get_json(session, "/api/hdp/devices", token=token)
-    r.raise_for_status()
-    payload = r.json()
-    if not isinstance(payload, list):
-        raise RuntimeError("unexpected /api/hdp/devices response shape (expected list)")
-
-    ids: List[str] = []
-    for item in payload:
-        if not isinstance(item, dict):
-            continue
-        # Prefer the canonical HDP id (e.g. "zigbee/0x...") which matches MQTT topics.
-        hdp_id = item.get("device_id")
-        if isinstance(hdp_id, str) and hdp_id:
-            ids.append(hdp_id)
-            continue
-        # Fallbacks (older payload shapes)
-        dev_id = item.get("id")
-        if isinstance(dev_id, str) and dev_id:
-            ids.append(dev_id)
-
-    # de-dupe, preserve order
-    seen = set()
-    ordered: List[str] = []
-    for dev_id in ids:
-        if dev_id in seen:
-            continue
-        seen.add(dev_id)
-        ordered.append(dev_id)
-    return ordered
+    return session.get(
+        url,
+        headers=headers,
+        cookies=cookies,
+        params=params,
+        timeout=15,
+        stream=stream,
+        allow_redirects=False,
+    )
+
+
+def fetch_device_ids(session: requests.Session, token: str, limit: int = 0) -> List[str]:
+    """Return unique device ids in server order, stopping once ``limit`` are collected."""
+    r = get_json(session, "/api/hdp/devices", token=token, stream=True)
+    try:
+        r.raise_for_status()
+        if ijson is not None:
+            r.raw.decode_content = True
+            events = ijson.parse(r.raw)
+            first = next(events, None)
+            if first is None or first[1] != "start_array":
+                raise RuntimeError("unexpected /api/hdp/devices response shape (expected list)")
+            items = ijson.items(chain([first], events), "item")
+        else:
+            items = _loads(r.content)
+            if not isinstance(items, list):
+                raise RuntimeError("unexpected /api/hdp/devices response shape (expected list)")
+
+        seen: Dict[str, None] = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            # Prefer the canonical HDP id (e.g. "zigbee/0x...") which matches MQTT topics.
+            dev_id = item.get("device_id")
+            if not (isinstance(dev_id, str) and dev_id):
+                # Fallbacks (older payload shapes)
+                dev_id = item.get("id")
+                if not (isinstance(dev_id, str) and dev_id):
+                    continue
+            seen.setdefault(dev_id, None)
+            if limit > 0 and len(seen) >= limit:
+                break
+        return list(seen)
+    finally:
+        r.close()
 
 
 def main() -> int:
     s = requests.Session()
-
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504), raise_on_status=False),
+    )
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+
+    warm_connection(s)
     token = login_start(s)
-    print(f"Logged in as {ADMIN_EMAIL} (token acquired)")
+    logger.info("Logged in as %s (token acquired)", ADMIN_EMAIL)
 
     # History health
     r = get_json(s, "/api/history/health", token=token)
-    _print_response("history health", r)
+    _log_response("history health", r, parse_body(r))
     r.raise_for_status()
 
-    device_ids = fetch_device_ids(s, token)
+    device_ids = fetch_device_ids(s, token, limit=HISTORY_MAX_DEVICES)
     if not device_ids:
-        print("No devices returned from /api/hdp/devices; nothing to query.")
+        logger.info("No devices returned from /api/hdp/devices; nothing to query.")
         return 0
 
-    if HISTORY_MAX_DEVICES > 0:
-        device_ids = device_ids[:HISTORY_MAX_DEVICES]
-
-    print(f"Querying history for {len(device_ids)} device(s)")
+    logger.info("Querying history for %d device(s)", len(device_ids))
 
-    any_fail = False
-    any_points = False
-    for dev_id in device_ids:
-        r = get_json(
+    def query_state(dev_id: str) -> requests.Response:
+        return get_json(
             s,
             "/api/history/state",
             token=token,
@@ -154,21 +205,30 @@ def main() -> int:
                 "order": HISTORY_ORDER,
             },
         )
-        _print_response(f"history state device_id={dev_id}", r)
+
+    # Per-device queries are independent; issue them concurrently over the pooled
+    # session and report in device order.
+    with ThreadPoolExecutor(max_workers=min(16, len(device_ids))) as pool:
+        responses = list(pool.map(query_state, device_ids))
+
+    any_fail = False
+    any_points = False
+    for dev_id, r in zip(device_ids, responses):
+        label = f"history state device_id={dev_id}"
+        # Decoded once here and shared by the log line and the points check.
+        body = parse_body(r)
+        _log_response(label, r, body)
         if r.status_code >= 400:
             any_fail = True
         else:
-            try:
-                body = r.json()
-                pts = body.get("points") if isinstance(body, dict) else None
-                if isinstance(pts, list) and len(pts) > 0:
-                    any_points = True
-            except Exception:
-                pass
+            pts = body.get("points") if isinstance(body, dict) else None
+            if isinstance(pts, list) and len(pts) > 0:
+                any_points = True
+                logger.info("%s: %d point(s)", label, len(pts))
 
     if not any_fail and not any_points:
-        print(
-            "\nNOTE: history returned 0 points for all devices. "
+        logger.info(
+            "NOTE: history returned 0 points for all devices. "
             "If you expect immediate data, set HISTORY_INGEST_RETAINED=true and restart history-service."
         )
 
@@ -176,14 +236,20 @@ def main() -> int:
 
 
 if __name__ == "__main__":
+    # Progress goes to stdout; warnings and errors stay on stderr.
+    _out = logging.StreamHandler(sys.stdout)
+    _out.addFilter(lambda record: record.levelno < logging.WARNING)
+    _err = logging.StreamHandler(sys.stderr)
+    _err.setLevel(logging.WARNING)
+    logging.basicConfig(level=os.getenv("E2E_LOG", "INFO").upper(), format="%(message)s", handlers=[_out, _err])
     try:
         raise SystemExit(main())
     except requests.HTTPError as e:
         resp = getattr(e, "response", None)
         if resp is not None:
-            _print_response("error", resp)
-        print(f"HTTP error: {e}", file=sys.stderr)
+            _log_response("error", resp, parse_body(resp))
+        logger.error("HTTP error: %s", e)
         raise SystemExit(2)
     except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
+        logger.error("Error: %s", e)
         raise SystemExit(2)
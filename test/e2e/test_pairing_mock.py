@@ -7,8 +7,8 @@ It performs the following high-level steps against the API gateway:
 1. Authenticate as the admin user and start a Zigbee pairing session.
 2. Create a synthetic Zigbee device through the public device API (to mimic a
    coordinator announcing a freshly interviewed node).
-3. Publish pairing progress frames over MQTT/WebSockets to emulate the Zigbee
-   adapter reporting interview updates.
+3. Follow the pairing progress device-hub pushes over MQTT/WebSockets until the
+   session detects the device (falling back to polling the REST API).
 4. Verify that the pairing session transitions to the completed state and that
    the synthetic device is visible through the device collection endpoint.
 
@@ -25,15 +25,26 @@ from __future__ import annotations
 import json
 import os
 import sys
+import threading
 import time
 import uuid
-from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
 from urllib.parse import urlparse
 
 import paho.mqtt.client as mqtt
 from paho.mqtt.client import CallbackAPIVersion
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from e2e_support import poll_backoff
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib codec is used when absent
+    orjson = None
 
 GATEWAY_ORIGIN = os.getenv("GATEWAY_ORIGIN", "http://localhost:8080")
 DEFAULT_WS_URL = os.getenv("WS_URL", "ws://localhost:8080/ws/hdp")
@@ -46,7 +57,36 @@ PAIRING_DEVICE_NAME = os.getenv("PAIRING_DEVICE_NAME", "Mock Zigbee Contact")
 KEEP_DEVICE = os.getenv("KEEP_MOCK_DEVICE", "0").lower() in {"1", "true", "yes"}
 PAIRING_TIMEOUT = int(os.getenv("PAIRING_TIMEOUT", "45"))
 PAIRING_PROGRESS_PREFIX = "homenavi/hdp/pairing/progress/"
-HDP_SCHEMA = "hdp.v1"
+DEVICE_EVENT_PREFIX = "homenavi/hdp/device/event/"
+# While waiting on MQTT pushes, re-check the REST API this often in case one was missed.
+WATCH_RECHECK_SECONDS = 2.0
+# Pairing metadata shared by every protocol run; name and model are filled in per protocol.
+MOCK_DEVICE_METADATA: Dict[str, object] = {
+    "type": "contact_sensor",
+    "manufacturer": "MockCo",
+    "description": "automated pipeline validation",
+    "icon": "door-sensor",
+}
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+# Every REST call goes to the same gateway origin; share one keep-alive pool.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504), raise_on_status=False),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+
+def warm_connection() -> None:
+    """Open the pooled gateway connection ahead of login via the unauthenticated /health."""
+    try:
+        SESSION.get(f"{GATEWAY_ORIGIN}/health", timeout=3, allow_redirects=False).close()
+    except requests.RequestException:
+        pass  # best effort; login opens the connection itself
 
 
 def _auth(token: str) -> Dict[str, str]:
@@ -54,13 +94,13 @@ def _auth(token: str) -> Dict[str, str]:
 
 
 def login() -> str:
-    resp = requests.post(
+    resp = SESSION.post(
         f"{GATEWAY_ORIGIN}/api/auth/login/start",
         json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
         timeout=10,
     )
     resp.raise_for_status()
-    payload = resp.json()
+    payload = _loads(resp.content)
     token = payload.get("access_token")
     if not token:
         raise RuntimeError("login missing access_token")
@@ -105,7 +145,7 @@ def build_device_name(protocol: str) -> str:
     return base
 
 
-@dataclass
+@dataclass(slots=True)
 class PairingSession:
     id: str
     protocol: str
@@ -125,7 +165,7 @@ class PairingSession:
 
 
 def start_pairing(token: str, protocol: str, metadata: Dict[str, str]) -> PairingSession:
-    resp = requests.post(
+    resp = SESSION.post(
         f"{GATEWAY_ORIGIN}/api/hdp/pairings",
         headers=_auth(token),
         cookies={"auth_token": token},
@@ -138,7 +178,7 @@ def start_pairing(token: str, protocol: str, metadata: Dict[str, str]) -> Pairin
     )
     if resp.status_code != 202:
         raise RuntimeError(f"pairing start failed status={resp.status_code} body={resp.text}")
-    return PairingSession.from_json(resp.json())
+    return PairingSession.from_json(_loads(resp.content))
 
 
 def create_mock_device(token: str, protocol: str, external_id: str) -> Dict[str, object]:
@@ -160,7 +200,7 @@ def create_mock_device(token: str, protocol: str, external_id: str) -> Dict[str,
             {"id": "contact", "type": "toggle", "property": "contact"},
         ],
     }
-    resp = requests.post(
+    resp = SESSION.post(
         f"{GATEWAY_ORIGIN}/api/hdp/devices",
         headers=_auth(token),
         cookies={"auth_token": token},
@@ -169,10 +209,18 @@ def create_mock_device(token: str, protocol: str, external_id: str) -> Dict[str,
     )
     if resp.status_code != 201:
         raise RuntimeError(f"device create failed status={resp.status_code} body={resp.text}")
-    return resp.json()
+    return _loads(resp.content)
 
 
-def publish_pairing_progress(token: str, protocol: str, events: Iterable[Dict[str, object]]) -> None:
+MessageCallback = Callable[[mqtt.Client, object, mqtt.MQTTMessage], None]
+
+
+def mqtt_connect(
+    token: str,
+    subscriptions: Sequence[Tuple[str, int]] = (),
+    on_message: Optional[MessageCallback] = None,
+) -> mqtt.Client:
+    """Connect to the broker over WebSockets and wait until the session is up."""
     parsed = urlparse(WS_STATE_URL)
     host = parsed.hostname or "localhost"
     port = parsed.port or (443 if parsed.scheme == "wss" else 80)
@@ -185,60 +233,130 @@ def publish_pairing_progress(token: str, protocol: str, events: Iterable[Dict[st
     )
     client.ws_set_options(path=path, headers={"Cookie": f"auth_token={token}"})
 
-    connected = False
+    ready = threading.Event()
 
-    def _on_connect(_client, _userdata, _flags, reason_code, _properties=None):
-        nonlocal connected
-        connected = reason_code == mqtt.MQTT_ERR_SUCCESS
+    def _on_connect(c, _userdata, _flags, reason_code, _properties=None):
+        if reason_code == mqtt.MQTT_ERR_SUCCESS:
+            if subscriptions:
+                c.subscribe(list(subscriptions))
+            else:
+                ready.set()
+
+    def _on_subscribe(_c, _userdata, _mid, _reason_codes, _properties=None):
+        # Only report ready once the broker has acknowledged the subscription,
+        # so no push published after we return can be missed.
+        ready.set()
 
     client.on_connect = _on_connect
+    client.on_subscribe = _on_subscribe
+    if on_message is not None:
+        client.on_message = on_message
     rc = client.connect(host, port, keepalive=30)
     if rc != 0:
         raise RuntimeError(f"mqtt connect failed rc={rc}")
     client.loop_start()
-    try:
-        deadline = time.time() + 5
-        while not connected:
-            if time.time() >= deadline:
-                raise RuntimeError("mqtt connect timeout")
-            time.sleep(0.05)
-        for evt in events:
-            payload = dict(evt)
-            topic_proto = str(payload.get("protocol") or protocol)
-            payload.setdefault("protocol", topic_proto)
-            payload.setdefault("schema", HDP_SCHEMA)
-            payload.setdefault("type", "pairing_progress")
-            print("PAIRING_PROGRESS_EMIT", json.dumps(payload, sort_keys=True))
-            data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
-            topic = f"{PAIRING_PROGRESS_PREFIX}{topic_proto}"
-            result = client.publish(topic, payload=data)
-            result.wait_for_publish()
-            time.sleep(0.1)
-    finally:
-        client.disconnect()
-        time.sleep(0.1)
-        client.loop_stop()
+    if not ready.wait(5):
+        mqtt_close(client)
+        raise RuntimeError("mqtt connect timeout")
+    return client
+
+
+def mqtt_close(client: mqtt.Client) -> None:
+    client.disconnect()
+    time.sleep(0.1)
+    client.loop_stop()
 
 
-def list_pairings(token: str) -> List[PairingSession]:
-    resp = requests.get(
+class PairingWatcher:
+    """Follows pairing sessions and device removals pushed by device-hub over MQTT.
+
+    Keeps the latest snapshot per session id, so a transition that lands before a
+    caller starts waiting is still observed.
+    """
+
+    def __init__(self, token: str) -> None:
+        self._cond = threading.Condition()
+        self._sessions: Dict[str, PairingSession] = {}
+        self._removed: Set[str] = set()
+        self._client = mqtt_connect(
+            token,
+            [(PAIRING_PROGRESS_PREFIX + "#", 0), (DEVICE_EVENT_PREFIX + "#", 0)],
+            self._on_message,
+        )
+
+    def close(self) -> None:
+        mqtt_close(self._client)
+
+    def _on_message(self, _client, _userdata, msg: mqtt.MQTTMessage) -> None:
+        try:
+            data = _loads(msg.payload)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        if msg.topic.startswith(PAIRING_PROGRESS_PREFIX):
+            # Session snapshots carry id/status; our own mock progress frames do not.
+            if not data.get("id") or "status" not in data:
+                return
+            session = PairingSession.from_json(data)
+            with self._cond:
+                # device-hub follows each full snapshot with an HDP envelope on the same
+                # topic that omits device_id while none is set; keep what we already know.
+                previous = self._sessions.get(session.id)
+                if previous is not None and not session.device_id and previous.device_id:
+                    session = replace(session, device_id=previous.device_id)
+                self._sessions[session.id] = session
+                self._cond.notify_all()
+        elif data.get("event") == "device_removed":
+            with self._cond:
+                self._removed.add(str(data.get("device_id") or ""))
+                self._cond.notify_all()
+
+    def wait_for_session(
+        self,
+        session_id: str,
+        predicate: Callable[[PairingSession], bool],
+        timeout: float,
+    ) -> Optional[PairingSession]:
+        """Block until the session satisfies predicate; None if the timeout expires first."""
+
+        def _matched() -> bool:
+            session = self._sessions.get(session_id)
+            return session is not None and predicate(session)
+
+        with self._cond:
+            if self._cond.wait_for(_matched, timeout):
+                return self._sessions[session_id]
+        return None
+
+    def wait_for_removed(self, device_id: str, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: device_id in self._removed, timeout)
+
+
+def get_pairing(token: str, session_id: str) -> Optional[PairingSession]:
+    # device-hub only exposes the collection route and sends no ETag, so fetch the
+    # list but materialize just the session we are waiting on.
+    resp = SESSION.get(
         f"{GATEWAY_ORIGIN}/api/hdp/pairings",
         headers=_auth(token),
         cookies={"auth_token": token},
         timeout=10,
+        allow_redirects=False,
     )
     resp.raise_for_status()
-    sessions = resp.json()
-    return [PairingSession.from_json(item) for item in sessions]
+    item = next((item for item in _loads(resp.content) if item.get("id") == session_id), None)
+    return PairingSession.from_json(item) if item is not None else None
 
 
 def stop_pairing(token: str, protocol: str) -> None:
-    resp = requests.delete(
+    resp = SESSION.delete(
         f"{GATEWAY_ORIGIN}/api/hdp/pairings",
         headers=_auth(token),
         cookies={"auth_token": token},
         params={"protocol": protocol},
         timeout=10,
+        allow_redirects=False,
     )
     if resp.status_code not in (200, 202, 204, 404):
         raise RuntimeError(f"pairing stop failed status={resp.status_code} body={resp.text}")
@@ -250,33 +368,67 @@ def wait_for_pairing_status(
     complete_statuses: Sequence[str],
     timeout: float = 20.0,
     label: str = "final",
+    watcher: Optional[PairingWatcher] = None,
 ) -> PairingSession:
-    expiry = time.time() + timeout
+    if watcher is not None:
+        return _await_session(
+            token, session_id, watcher, lambda sess: sess.status in complete_statuses, timeout, label
+        )
     last_session: Optional[PairingSession] = None
-    while time.time() <= expiry:
-        for sess in list_pairings(token):
-            if sess.id == session_id:
-                last_session = sess
-                extra = f" device_id={sess.device_id}" if sess.device_id else ""
-                print(f"PAIRING_STATUS[{label}] status={sess.status} active={sess.active}{extra}")
-                if sess.status in complete_statuses:
-                    return sess
-                break
-        else:
+    for _ in poll_backoff(timeout):
+        sess = get_pairing(token, session_id)
+        if sess is None:
             if last_session:
                 return last_session
-        time.sleep(0.5)
+            continue
+        last_session = sess
+        extra = f" device_id={sess.device_id}" if sess.device_id else ""
+        print(f"PAIRING_STATUS[{label}] status={sess.status} active={sess.active}{extra}")
+        if sess.status in complete_statuses:
+            return sess
     if last_session:
         return last_session
     raise RuntimeError("pairing session not found during wait")
 
 
+def _await_session(
+    token: str,
+    session_id: str,
+    watcher: PairingWatcher,
+    predicate: Callable[[PairingSession], bool],
+    timeout: float,
+    label: str,
+) -> PairingSession:
+    # Pushes normally settle the wait; a coarse REST re-check covers a missed one
+    # without sitting out the whole timeout.
+    deadline = time.monotonic() + timeout
+    session: Optional[PairingSession] = None
+    while session is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        session = watcher.wait_for_session(session_id, predicate, min(WATCH_RECHECK_SECONDS, remaining))
+        if session is None:
+            polled = get_pairing(token, session_id)
+            if polled is not None and predicate(polled):
+                session = polled
+    if session is None:
+        # No match before the deadline; settle with one authoritative read.
+        session = get_pairing(token, session_id)
+        if session is None:
+            raise RuntimeError("pairing session not found during wait")
+    extra = f" device_id={session.device_id}" if session.device_id else ""
+    print(f"PAIRING_STATUS[{label}] status={session.status} active={session.active}{extra}")
+    return session
+
+
 def wait_for_session_status(
     token: str,
     session_id: str,
     expected_statuses: Sequence[str],
     label: str,
     timeout: float = 12.0,
+    watcher: Optional[PairingWatcher] = None,
 ) -> PairingSession:
     session = wait_for_pairing_status(
         token,
@@ -284,6 +436,7 @@ def wait_for_session_status(
         expected_statuses,
         timeout=timeout,
         label=label,
+        watcher=watcher,
     )
     if session.status not in expected_statuses:
         raise RuntimeError(f"pairing status {session.status} not in expected {expected_statuses}")
@@ -296,47 +449,57 @@ def wait_for_pairing_device(
     expected_device_id: str,
     timeout: float = 12.0,
     label: str = "device",
+    watcher: Optional[PairingWatcher] = None,
 ) -> PairingSession:
-    expiry = time.time() + timeout
+    if watcher is not None:
+        return _await_session(
+            token,
+            session_id,
+            watcher,
+            lambda sess: bool(expected_device_id and sess.device_id == expected_device_id)
+            or sess.status in ("completed", "failed", "timeout", "stopped"),
+            timeout,
+            label,
+        )
     last_session: Optional[PairingSession] = None
-    while time.time() <= expiry:
-        for sess in list_pairings(token):
-            if sess.id != session_id:
-                continue
-            last_session = sess
-            extra = f" device_id={sess.device_id}" if sess.device_id else ""
-            print(f"PAIRING_STATUS[{label}] status={sess.status} active={sess.active}{extra}")
-            if expected_device_id and sess.device_id == expected_device_id:
-                return sess
-            if sess.status in ("completed", "failed", "timeout", "stopped"):
-                return sess
-            break
-        time.sleep(0.5)
+    for _ in poll_backoff(timeout):
+        sess = get_pairing(token, session_id)
+        if sess is None:
+            continue
+        last_session = sess
+        extra = f" device_id={sess.device_id}" if sess.device_id else ""
+        print(f"PAIRING_STATUS[{label}] status={sess.status} active={sess.active}{extra}")
+        if expected_device_id and sess.device_id == expected_device_id:
+            return sess
+        if sess.status in ("completed", "failed", "timeout", "stopped"):
+            return sess
     if last_session:
         return last_session
     raise RuntimeError("pairing session not found during device wait")
 
 
 def list_devices(token: str) -> List[Dict[str, object]]:
-    resp = requests.get(
+    resp = SESSION.get(
         f"{GATEWAY_ORIGIN}/api/hdp/devices",
         headers=_auth(token),
         cookies={"auth_token": token},
         timeout=10,
+        allow_redirects=False,
     )
     resp.raise_for_status()
-    data = resp.json()
+    data = _loads(resp.content)
     if not isinstance(data, list):
         raise RuntimeError("unexpected devices payload")
     return data
 
 
-def delete_device(token: str, device_id: str, external_id: str) -> None:
-    resp = requests.delete(
+def delete_device(token: str, device_id: str, external_id: str, watcher: Optional[PairingWatcher] = None) -> None:
+    resp = SESSION.delete(
         f"{GATEWAY_ORIGIN}/api/hdp/devices/{device_id}?force=1",
         headers=_auth(token),
         cookies={"auth_token": token},
         timeout=10,
+        allow_redirects=False,
     )
     if resp.status_code in (200, 204, 404):
         print(f"MOCK_DEVICE_REMOVE status={resp.status_code} immediate=True")
@@ -344,34 +507,47 @@ def delete_device(token: str, device_id: str, external_id: str) -> None:
     if resp.status_code == 202:
         # removal queued via protocol-specific cleanup; wait for disappearance.
         print("MOCK_DEVICE_REMOVE status=202 awaiting removal queue")
-        wait_for_device_absence(token, external_id)
+        wait_for_device_absence(token, external_id, watcher=watcher)
         return
     raise RuntimeError(f"device delete failed status={resp.status_code} body={resp.text}")
 
 
-def wait_for_device_absence(token: str, external_id: str, timeout: float = 15.0) -> None:
-    expiry = time.time() + timeout
+def _device_present(token: str, external_id: str) -> bool:
+    suffix = external_id_suffix(external_id)
+    return any((dev.get("device_id") == external_id) or (suffix and dev.get("external_id") == suffix) for dev in list_devices(token))
+
+
+def wait_for_device_absence(
+    token: str,
+    external_id: str,
+    timeout: float = 15.0,
+    watcher: Optional[PairingWatcher] = None,
+) -> None:
+    if watcher is not None:
+        # Wait for the device_removed event, re-checking the device list now and then
+        # in case the push was missed.
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if watcher.wait_for_removed(external_id, max(0.0, min(WATCH_RECHECK_SECONDS, remaining))):
+                return
+            if not _device_present(token, external_id):
+                return
+            if remaining <= WATCH_RECHECK_SECONDS:
+                raise RuntimeError(f"device {external_id} still present after delete")
     suffix = external_id_suffix(external_id)
-    while time.time() <= expiry:
+    for _ in poll_backoff(timeout):
         devices = list_devices(token)
         if not any((dev.get("device_id") == external_id) or (suffix and dev.get("external_id") == suffix) for dev in devices):
             return
-        time.sleep(0.5)
     raise RuntimeError(f"device {external_id} still present after delete")
 
 
-def run_for_protocol(token: str, protocol: str) -> None:
+def run_for_protocol(token: str, protocol: str, watcher: Optional[PairingWatcher] = None) -> None:
     external_id = build_external_id(protocol)
     device_id_expected = expected_device_id(protocol, external_id)
     device_name = build_device_name(protocol)
-    metadata = {
-        "name": device_name,
-        "type": "contact_sensor",
-        "manufacturer": "MockCo",
-        "model": f"{protocol.upper()}-TEST",
-        "description": "automated pipeline validation",
-        "icon": "door-sensor",
-    }
+    metadata = {**MOCK_DEVICE_METADATA, "name": device_name, "model": f"{protocol.upper()}-TEST"}
     session = start_pairing(token, protocol, metadata)
     print(f"PAIRING_START protocol={protocol} session_id={session.id} status={session.status} device_id={device_id_expected}")
     device_record = None
@@ -389,6 +565,7 @@ def run_for_protocol(token: str, protocol: str) -> None:
             expected_device_id=str(device_id or ""),
             timeout=12.0,
             label="device_detect",
+            watcher=watcher,
         )
         if observed.active:
             stop_pairing(token, protocol)
@@ -397,6 +574,7 @@ def run_for_protocol(token: str, protocol: str) -> None:
             session.id,
             ("stopped", "completed", "failed", "timeout"),
             label="final",
+            watcher=watcher,
         )
 
         print(f"PAIRING_FINAL protocol={protocol} status={final_session.status} active={final_session.active}")
@@ -416,7 +594,7 @@ def run_for_protocol(token: str, protocol: str) -> None:
     finally:
         if not KEEP_DEVICE and device_record and device_record.get("id"):
             try:
-                delete_device(token, device_record["id"], device_id_expected)
+                delete_device(token, device_record["id"], device_id_expected, watcher=watcher)
                 print(f"MOCK_DEVICE_REMOVED protocol={protocol} device_id={device_record['id']}")
             except Exception as exc:
                 print(f"MOCK_DEVICE_REMOVE_FAILED protocol={protocol} {exc}")
@@ -424,10 +602,26 @@ def run_for_protocol(token: str, protocol: str) -> None:
 
 def run() -> None:
     print(f"LOGIN user={ADMIN_EMAIL} origin={GATEWAY_ORIGIN}")
+    warm_connection()
     token = login()
     print("LOGIN_OK")
-    for proto in PAIRING_PROTOCOLS:
-        run_for_protocol(token, proto)
+    # Subscribe before any session starts so no transition is missed; without a
+    # broker connection the waits fall back to polling the REST API.
+    watcher: Optional[PairingWatcher] = None
+    try:
+        watcher = PairingWatcher(token)
+    except Exception as exc:
+        print(f"PAIRING_WATCH_UNAVAILABLE {exc}; polling instead")
+    try:
+        # Protocol runs are independent server-side and mostly wait on I/O; the shared
+        # session pool and the watcher are both safe to use from several threads.
+        with ThreadPoolExecutor(max_workers=max(1, len(PAIRING_PROTOCOLS))) as pool:
+            futures = [pool.submit(run_for_protocol, token, proto, watcher) for proto in PAIRING_PROTOCOLS]
+            for fut in as_completed(futures):
+                fut.result()
+    finally:
+        if watcher is not None:
+            watcher.close()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,14 @@
 import requests
-import json
+from requests.adapters import HTTPAdapter
 
 USER_SERVICE_URL = "http://localhost:8001"
+# (connect, read) seconds; a dead service fails the step instead of hanging the script.
+TIMEOUT = (2, 5)
+
+# One keep-alive connection serves every call below.
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
 
 # Test user creation
 print("\nTesting user creation...")
@@ -10,7 +17,7 @@ user_data = {
     "email": "testuser@example.com",
     "password": "password123"
 }
-resp = requests.post(f"{USER_SERVICE_URL}/user", json=user_data)
+resp = SESSION.post(f"{USER_SERVICE_URL}/user", json=user_data, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 if resp.status_code == 201:
@@ -22,49 +29,49 @@ else:
 
 # Test get user
 print("\nTesting get user...")
-resp = requests.get(f"{USER_SERVICE_URL}/user/{user_id}")
+resp = SESSION.get(f"{USER_SERVICE_URL}/user/{user_id}", timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test send email verification (simulate trigger)
 print("\nTesting send email verification...")
-resp = requests.post(f"{USER_SERVICE_URL}/user/email/send-verification", json={"user_id": user_id})
+resp = SESSION.post(f"{USER_SERVICE_URL}/user/email/send-verification", json={"user_id": user_id}, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test email verification
 print("\nTesting email verification...")
 verification_code = input("Provide the verification code sent to your email and press Enter...")
-resp = requests.post(f"{USER_SERVICE_URL}/user/email/verify", json={"user_id": user_id, "code": verification_code})
+resp = SESSION.post(f"{USER_SERVICE_URL}/user/email/verify", json={"user_id": user_id, "code": verification_code}, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test 2FA setup (simulate trigger)
 print("\nTesting 2FA setup...")
-resp = requests.post(f"{USER_SERVICE_URL}/user/2fa/setup", json={"user_id": user_id, "method": "totp"})
+resp = SESSION.post(f"{USER_SERVICE_URL}/user/2fa/setup", json={"user_id": user_id, "method": "totp"}, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test 2FA verify
 print("\nTesting 2FA verify...")
-resp = requests.post(f"{USER_SERVICE_URL}/user/2fa/verify", json={"user_id": user_id, "code": "654321", "method": "totp"})
+resp = SESSION.post(f"{USER_SERVICE_URL}/user/2fa/verify", json={"user_id": user_id, "code": "654321", "method": "totp"}, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test 2FA disable
 print("\nTesting 2FA disable...")
-resp = requests.post(f"{USER_SERVICE_URL}/user/2fa/disable", json={"user_id": user_id, "method": "totp"})
+resp = SESSION.post(f"{USER_SERVICE_URL}/user/2fa/disable", json={"user_id": user_id, "method": "totp"}, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test lockout
 print("\nTesting lockout...")
-resp = requests.post(f"{USER_SERVICE_URL}/user/lockout", json={"user_id": user_id, "lock": True})
+resp = SESSION.post(f"{USER_SERVICE_URL}/user/lockout", json={"user_id": user_id, "lock": True}, timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")
 
 # Test delete user
 print("\nTesting delete user...")
-resp = requests.delete(f"{USER_SERVICE_URL}/user/{user_id}")
+resp = SESSION.delete(f"{USER_SERVICE_URL}/user/{user_id}", timeout=TIMEOUT)
 print(f"Status: {resp.status_code}")
 print(f"Body: {resp.text}")